@@ -17,6 +17,9 @@ their shortest paths.
 
 
 import logging
+import Queue
+import threading
+import time
 
 from nox.lib.core import *
 import nox.lib.openflow as openflow
@@ -32,6 +35,25 @@ from nox.lib.equalized_flow import *
 
 log = logging.getLogger('nox.coreapps.tutorial.pytutorial')
 
+# Bounds on the equalized path search the worker thread runs for each batch
+# of new clients of a service: at most this many partial paths per path
+# search, and at most this many seconds for the whole batch (one
+# addClients() call).  When either runs out, the best paths found so far
+# are used.  Set to None to search without limit.
+LEQ_MAX_EXPANSIONS = 100000
+LEQ_TIME_BUDGET = 0.05
+
+# The topology snapshot the controller routes over.
+LEQ_GRAPH_FILE = '/home/mininet/noxcore/build/src/nox/lib/sample'
+
+# LEQ paths are computed by a worker thread; finished jobs are picked up and
+# their flow rules installed every this many seconds.
+LEQ_POLL_INTERVAL = 0.01
+
+# New clients of a service arriving within this many seconds of each other
+# are equalized together in a single batch.
+LEQ_BATCH_WINDOW = 0.05
+
 class LEQ_service():
     def __init__(self, id, ip, protocol, port, dpid):
         self.id = id
@@ -39,7 +61,7 @@ class LEQ_service():
         self.protocol = protocol
         self.port = port
         self.dpid = dpid
-        self.clients = []
+        self.clients = set()
 
 class COS561Test(Component):
 
@@ -47,9 +69,20 @@ class COS561Test(Component):
         Component.__init__(self, ctxt)
 
         self.routers = []
-        self.g = loadGraphFromFile('/home/mininet/noxcore/build/src/nox/lib/sample')
+        self.g = loadGraphFromFile(LEQ_GRAPH_FILE)
         self.portmap = self.g.getPortMap()
-        self.eq = EqualizedFlow(self.g)
+
+        # Graph lookups update the graph's caches, so the worker thread gets
+        # its own copy of the graph, and self.eq is only ever used from the
+        # worker thread.
+        self.eq = EqualizedFlow(loadGraphFromFile(LEQ_GRAPH_FILE),
+                                LEQ_MAX_EXPANSIONS, LEQ_TIME_BUDGET)
+
+        # The shortest-path rules of every switch are computed up front, so
+        # a switch joining only has to push its cached table.
+        self.baseline_tables = {}
+        for node in self.g.nodes:
+            self.baseline_table(node)
 
         log.debug("PORTMAP: " + str(self.portmap))
 
@@ -57,6 +90,33 @@ class COS561Test(Component):
         self.next_LEQ_id = 0
         self.reg_LEQ_services = []
 
+        # Registered services indexed by their (ip, protocol, port) endpoint,
+        # matched against the source of packets from a service and the
+        # destination of packets to one.
+        self.LEQ_service_index = {}
+
+        # New clients are collected in per-service batches, keyed by service
+        # id, which are queued as jobs for the worker thread, after the job
+        # registering their service.  The worker puts
+        # the paths it computed on the results queue.
+        self.jobs = Queue.Queue()
+        self.batches = {}
+        self.results = Queue.Queue()
+        self.metrics = {'jobs_queued': 0, 'jobs_completed': 0, 'clients_queued': 0,
+                        'total_wait': 0.0, 'total_compute': 0.0, 'max_compute': 0.0,
+                        'flows_add': 0, 'flows_modify': 0, 'flows_delete': 0}
+
+        # The output port each client of a service needs at each switch of
+        # its path, as leq_flows[(service id, client ip)][(dpid, 'to' or
+        # 'from')] = outport, and the same indexed by switch, as
+        # switch_clients[(dpid, service id, direction)][client ip] = outport.
+        self.leq_flows = {}
+        self.switch_clients = {}
+
+        # Model of the (aggregated) LEQ rules installed on each switch, as
+        # flow_table[dpid][(service id, direction)][(network, length)] = outport.
+        self.flow_table = {}
+
     def process_packet(self, dpid, inport, packet, buf, bufid):
         """Learn MAC src port mapping, then flood or send unicast."""
 
@@ -116,22 +176,22 @@ class COS561Test(Component):
                         return
 
                     # Make sure we don't already have this service.
-                    for service in self.reg_LEQ_services:
-                        if(new_service.ip == service.ip and
-                           new_service.protocol == service.protocol and
-                           new_service.port == service.port):
-                            log.debug("SERVICE IS A DUPLICATE")
-                            return
+                    key = (new_service.ip, new_service.protocol, new_service.port)
+                    if key in self.LEQ_service_index:
+                        log.debug("SERVICE IS A DUPLICATE")
+                        return
 
-                    # Add the new service to the list.
+                    # Add the new service to the list and the index.
                     self.reg_LEQ_services.append(new_service)
+                    self.LEQ_service_index[key] = new_service
                     
                     for service in self.reg_LEQ_services:
                         log.debug(str(service.ip) + ', ' + str(service.protocol) + ', ' +
                                   str(service.port))
 
-                    # And register with the LEQ algorithm itself.
-                    self.eq.registerService(service.dpid, service.id, alpha, x)
+                    # And have the worker register it with the LEQ algorithm
+                    # itself, ahead of any of its clients.
+                    self.jobs.put(('register', new_service, alpha, x))
 
                     # Insert flow rules for each switch: whenever a new client tries
                     # to talk to a LEQ service (or vice versa), we will send the packet
@@ -183,113 +243,256 @@ class COS561Test(Component):
                 log.debug("dstip: " + str(iphdr.dstip) + ", dstport: " + str(dport) + ", protocol: "
                           + str(iphdr.protocol))
 
-                serv = None
-
-                for service in self.reg_LEQ_services:
-                    if(iphdr.srcip == service.ip and iphdr.protocol == service.protocol and
-                       sport == service.port):
-                        log.debug("GOT PACKET FROM SERVICE")
-                        serv = service
-                        client_ip = ip_to_str(iphdr.dstip)
-                        client_port = dport
-                        is_to_service = False
-                        break
-
-                    elif(iphdr.dstip == service.ip and iphdr.protocol == service.protocol and
-                         dport == service.port):
-                        log.debug("GOT PACKET TO SERVICE")
-                        serv = service
-                        client_ip = ip_to_str(iphdr.srcip)
-                        client_port = sport
-                        is_to_service = True
-                        break
-                 
-                if serv is None:
-                    return
+                serv = self.LEQ_service_index.get((iphdr.srcip, iphdr.protocol, sport))
+                if serv is not None:
+                    log.debug("GOT PACKET FROM SERVICE")
+                    client_ip = ip_to_str(iphdr.dstip)
+                    client_port = dport
+                    is_to_service = False
+                else:
+                    serv = self.LEQ_service_index.get((iphdr.dstip, iphdr.protocol, dport))
+                    if serv is None:
+                        return
+                    log.debug("GOT PACKET TO SERVICE")
+                    client_ip = ip_to_str(iphdr.srcip)
+                    client_port = sport
+                    is_to_service = True
+
+                dst_ip = ip_to_str(iphdr.dstip)
 
                 if client_ip in serv.clients:
+                    # Its LEQ paths may still be being computed, so keep
+                    # forwarding on the shortest path until they are installed.
+                    self.forward_shortest_path(dpid, inport, buf, bufid, dst_ip)
                     return
 
                 # This is a legit new client, so add it to the service's list and
-                # compute the new paths.
+                # to the service's open batch, which the worker equalizes once
+                # the batch window closes.  Meanwhile the packet takes the
+                # shortest path.
                 log.debug("client: " + str(client_ip) + ", serv " + str(serv.ip))
-                serv.clients.append(client_ip)
-                self.eq.addClients(serv.dpid, serv.id,
-                                   [self.g.getNodeFromClientIP(client_ip)])
-                changed_clients = self.eq.getUpdatedClients(serv.dpid, serv.id)
-                
-                log.debug("PATHS: " + str(self.eq.paths))
-                
-                # Add flow rules for the new paths.
-                toserv_flow = {}
-                toserv_flow[core.DL_TYPE] = ethernet.IP_TYPE
-                toserv_flow[core.NW_PROTO] = serv.protocol
-                toserv_flow[core.NW_DST] = serv.ip
-                toserv_flow[core.TP_DST] = serv.port
-
-                fromserv_flow = {}
-                fromserv_flow[core.DL_TYPE] = ethernet.IP_TYPE
-                fromserv_flow[core.NW_PROTO] = serv.protocol
-                fromserv_flow[core.NW_SRC] = serv.ip
-                fromserv_flow[core.TP_SRC] = serv.port
-
-                for client in serv.clients:
-                    client_node = self.g.getNodeFromClientIP(client)
-
-                    # Skip clients whose path has not changed.
-                    if(not (client_node in changed_clients)):
-                        log.debug("Skipping client " + str(client) + " due to no change.")
-                        continue
-
-                    path = self.eq.paths[(serv.dpid, serv.id)][client_node]
-                    log.debug(str(path))
-                    for i in range(len(path)) :
-                        log.debug("path[" + str(i) + "]: " + str(path[i]))
-
-                        # Install the client -> server rule.
-                        toserv_flow[core.NW_SRC] = client
-
-                        # to do inport, I need to set different actionsbased on the inport
-                        # doesn't look like I can actually use the inport to match. only
-                        # so that we don't broadcast to it when we need to
-
-                        if(i == len(path) - 1):
-                            outport = self.portmap[path[i]][ip_to_str(serv.ip)]
-                            actions = [[openflow.OFPAT_OUTPUT, [0, outport]]]
-                            log.debug("toserv port is " + str(outport))
-                        else:
-                            outport = self.portmap[path[i]][path[i+1]]
-                            actions = [[openflow.OFPAT_OUTPUT, [0, outport]]]
-                            log.debug("toserv port is " + str(outport))
-
-                        self.install_datapath_flow(path[i], toserv_flow, openflow.OFP_FLOW_PERMANENT,
-                                                   openflow.OFP_FLOW_PERMANENT, actions,
-                                                   priority=0x9000)
-
-                        if(client_ip == client and path[i] == dpid and is_to_service == True):
-                            cur_outport = outport
-
-                        # Install the server -> client rule.
-                        fromserv_flow[core.NW_DST] = client
-
-                        if(i == 0):
-                            outport = self.portmap[path[i]][client]
-                            actions = [[openflow.OFPAT_OUTPUT, [0, outport]]]
-                            log.debug("fromserv port is " + str(outport))
-                        else:
-                            outport = self.portmap[path[i]][path[i-1]]
-                            actions = [[openflow.OFPAT_OUTPUT, [0, outport]]]
-                            log.debug("fromserv port is " + str(outport))
-
-                        self.install_datapath_flow(path[i], fromserv_flow, openflow.OFP_FLOW_PERMANENT,
-                                                   openflow.OFP_FLOW_PERMANENT, actions,
-                                                   priority=0x9000)
-
-                        if(client_ip == client and path[i] == dpid and is_to_service == False):
-                            cur_outport = outport
-
-                # Finally, send the actual packet out.
-                self.send_openflow(dpid, bufid, buf, cur_outport, inport)               
+                serv.clients.add(client_ip)
+                self.batch_client(serv, client_ip)
+                self.forward_shortest_path(dpid, inport, buf, bufid, dst_ip)
+
+    def batch_client(self, serv, client_ip):
+        """Add a new client to the open batch of serv, opening one if needed."""
+        if serv.id in self.batches:
+            self.batches[serv.id][1].append(client_ip)
+            return
+        self.batches[serv.id] = (time.time(), [client_ip])
+        self.post_callback(LEQ_BATCH_WINDOW, lambda: self.close_batch(serv))
+
+    def close_batch(self, serv):
+        """Queue all clients batched for serv as a single job for the worker."""
+        (opened, client_ips) = self.batches.pop(serv.id)
+        self.jobs.put(('clients', serv, client_ips, opened))
+        self.metrics['jobs_queued'] += 1
+        self.metrics['clients_queued'] += len(client_ips)
+
+    def forward_shortest_path(self, dpid, inport, buf, bufid, dst_ip):
+        """Send a packet out of dpid towards dst_ip along the shortest path."""
+        dst_node = self.g.getNodeFromClientIP(dst_ip)
+        if dst_node is None:
+            return
+        if dst_node == dpid:
+            outport = self.portmap[dpid][dst_ip]
+        else:
+            outport = self.portmap[dpid][self.g.getNextHop(dpid, dst_node)]
+        self.send_openflow(dpid, bufid, buf, outport, inport)
+
+    def leq_worker(self):
+        """Register queued services and compute the LEQ paths of queued batches of new clients, off the packet-in path."""
+        while True:
+            job = self.jobs.get()
+            if job[0] == 'register':
+                (kind, serv, alpha, x) = job
+                self.eq.registerService(serv.dpid, serv.id, alpha, x)
+                continue
+            (kind, serv, client_ips, queued) = job
+            started = time.time()
+            try:
+                nodes = []
+                for ip in client_ips:
+                    node = self.eq.g.getNodeFromClientIP(ip)
+                    if node not in nodes:
+                        nodes.append(node)
+                self.eq.addClients(serv.dpid, serv.id, nodes)
+                # A new client ip on a node already in the service leaves
+                # the paths unchanged but still needs rules, so the batch's
+                # own nodes are sent back along with the changed ones;
+                # install_leq_paths() skips the rules already in place.
+                service_paths = self.eq.paths[(serv.dpid, serv.id)]
+                paths = {}
+                for client_node in set(nodes) | set(self.eq.getUpdatedClients(serv.dpid, serv.id)):
+                    if client_node in service_paths:
+                        paths[client_node] = list(service_paths[client_node])
+                log.debug("SEARCH STATS: " + str(self.eq.getSearchStats()))
+            except Exception:
+                log.exception("LEQ path computation failed")
+                paths = {}
+            self.results.put((serv, paths, queued, started, time.time()))
+
+    def install_finished_jobs(self):
+        """Install the flow rules of every job the worker has finished."""
+        while True:
+            try:
+                (serv, paths, queued, started, finished) = self.results.get_nowait()
+            except Queue.Empty:
+                break
+            self.install_leq_paths(serv, paths)
+            self.metrics['jobs_completed'] += 1
+            self.metrics['total_wait'] += started - queued
+            self.metrics['total_compute'] += finished - started
+            self.metrics['max_compute'] = max(self.metrics['max_compute'], finished - started)
+            log.debug("BACKLOG: " + str(self.getBacklog()))
+        self.post_callback(LEQ_POLL_INTERVAL, self.install_finished_jobs)
+
+    def getBacklog(self):
+        """
+        Return the state of the LEQ computation pipeline: open batches, jobs
+        waiting for the worker, finished jobs waiting to be installed, job
+        and client counts, the average queueing delay and average/maximum
+        computation time in seconds, and the LEQ rules added, modified and
+        deleted so far.
+        """
+        completed = self.metrics['jobs_completed']
+        return {'open_batches': len(self.batches),
+                'queue_depth': self.jobs.qsize(),
+                'results_pending': self.results.qsize(),
+                'jobs_queued': self.metrics['jobs_queued'],
+                'clients_queued': self.metrics['clients_queued'],
+                'jobs_completed': completed,
+                'avg_wait': self.metrics['total_wait'] / max(completed, 1),
+                'avg_compute': self.metrics['total_compute'] / max(completed, 1),
+                'max_compute': self.metrics['max_compute'],
+                'flows_added': self.metrics['flows_add'],
+                'flows_modified': self.metrics['flows_modify'],
+                'flows_deleted': self.metrics['flows_delete']}
+
+    def leq_match(self, serv, prefix, direction):
+        """Return the match of the LEQ rule of the clients in prefix in direction ('to' or 'from' serv)."""
+        (network, length) = prefix
+        flow = {}
+        flow[core.DL_TYPE] = ethernet.IP_TYPE
+        flow[core.NW_PROTO] = serv.protocol
+        if direction == 'to':
+            flow[core.NW_SRC] = ip_to_str(network)
+            if length < 32:
+                flow[core.NW_SRC_N_WILD] = 32 - length
+            flow[core.NW_DST] = serv.ip
+            flow[core.TP_DST] = serv.port
+        else:
+            flow[core.NW_SRC] = serv.ip
+            flow[core.TP_SRC] = serv.port
+            flow[core.NW_DST] = ip_to_str(network)
+            if length < 32:
+                flow[core.NW_DST_N_WILD] = 32 - length
+        return flow
+
+    def path_flows(self, serv, client, path):
+        """Return the LEQ rules of client along path, as {(dpid, direction): outport}."""
+        flows = {}
+        for i in range(len(path)):
+            log.debug("path[" + str(i) + "]: " + str(path[i]))
+
+            # to do inport, I need to set different actionsbased on the inport
+            # doesn't look like I can actually use the inport to match. only
+            # so that we don't broadcast to it when we need to
+
+            # The client -> server rule.
+            if(i == len(path) - 1):
+                flows[(path[i], 'to')] = self.portmap[path[i]][ip_to_str(serv.ip)]
+            else:
+                flows[(path[i], 'to')] = self.portmap[path[i]][path[i+1]]
+
+            # The server -> client rule.
+            if(i == 0):
+                flows[(path[i], 'from')] = self.portmap[path[i]][client]
+            else:
+                flows[(path[i], 'from')] = self.portmap[path[i]][path[i-1]]
+        return flows
+
+    def install_leq_paths(self, serv, paths):
+        """
+        Move the clients of serv onto their new paths.  At every switch where
+        the output port of some client changes, the clients with the same
+        output port are aggregated into the fewest prefixes that cover
+        exactly them, and that rule set is diffed against the one in the flow
+        table model, so only the rules that have to be added, modified or
+        deleted are sent, grouped per switch.
+        """
+
+        log.debug("PATHS: " + str(paths))
+
+        changed = set()
+        for client in serv.clients:
+            client_node = self.g.getNodeFromClientIP(client)
+
+            # Skip clients whose path has not changed.
+            if(not (client_node in paths)):
+                log.debug("Skipping client " + str(client) + " due to no change.")
+                continue
+
+            path = paths[client_node]
+            log.debug(str(path))
+            new_flows = self.path_flows(serv, client, path)
+            old_flows = self.leq_flows.get((serv.id, client), {})
+
+            for (hop, direction) in old_flows:
+                if (hop, direction) not in new_flows:
+                    del self.switch_clients[(hop, serv.id, direction)][client]
+                    changed.add((hop, direction))
+            for ((hop, direction), outport) in new_flows.iteritems():
+                if old_flows.get((hop, direction)) != outport:
+                    self.switch_clients.setdefault((hop, serv.id, direction), {})[client] = outport
+                    changed.add((hop, direction))
+
+            self.leq_flows[(serv.id, client)] = new_flows
+
+        changes = {}
+        for (dpid, direction) in changed:
+            clients_by_port = {}
+            for (client, outport) in self.switch_clients[(dpid, serv.id, direction)].iteritems():
+                clients_by_port.setdefault(outport, []).append(parsePrefix(client))
+            rules = {}
+            for (outport, prefixes) in clients_by_port.iteritems():
+                for prefix in aggregatePrefixes(prefixes):
+                    rules[prefix] = outport
+
+            old_rules = self.flow_table.setdefault(dpid, {}).get((serv.id, direction), {})
+            ops = changes.setdefault(dpid, [])
+            for (prefix, outport) in rules.iteritems():
+                if prefix not in old_rules:
+                    ops.append(('add', direction, prefix, outport))
+                elif old_rules[prefix] != outport:
+                    ops.append(('modify', direction, prefix, outport))
+            for prefix in old_rules:
+                if prefix not in rules:
+                    ops.append(('delete', direction, prefix, None))
+            self.flow_table[dpid][(serv.id, direction)] = rules
+
+        for (dpid, ops) in changes.iteritems():
+            self.program_switch(dpid, serv, ops)
+
+    def program_switch(self, dpid, serv, ops):
+        """Apply a batch of LEQ rule changes for serv to one switch."""
+        # Install the new rules before deleting the ones they replace, so
+        # clients moved into an aggregate are never left without a rule.
+        order = {'add': 0, 'modify': 1, 'delete': 2}
+        for (op, direction, prefix, outport) in sorted(ops, key=lambda op: order[op[0]]):
+            match = self.leq_match(serv, prefix, direction)
+            if op == 'delete':
+                self.delete_strict_datapath_flow(dpid, match, priority=0x9000)
+            else:
+                # Adding a rule with an existing match and priority replaces
+                # its actions, which is how a rule is modified.
+                log.debug(direction + "serv port is " + str(outport))
+                actions = [[openflow.OFPAT_OUTPUT, [0, outport]]]
+                self.install_datapath_flow(dpid, match, openflow.OFP_FLOW_PERMANENT,
+                                           openflow.OFP_FLOW_PERMANENT, actions,
+                                           priority=0x9000)
+            self.metrics['flows_' + op] += 1
 
 
     def packet_in_callback(self, dpid, inport, reason, len, bufid, packet):
@@ -319,32 +522,76 @@ class COS561Test(Component):
         self.install_datapath_flow(dpid, flow, openflow.OFP_FLOW_PERMANENT,
                                    openflow.OFP_FLOW_PERMANENT, actions, priority=0xa000)
 
-        # Install shortest-path rules for each host IP.
-        flow = {}
-        flow[core.DL_TYPE] = ethernet.IP_TYPE
+        # Install the shortest-path rules for each host IP.
+        for (prefix, outport) in self.baseline_table(dpid).iteritems():
+            flow = {}
+            flow[core.DL_TYPE] = ethernet.IP_TYPE
+            flow[core.NW_DST] = ip_to_str(prefix[0])
+            if prefix[1] < 32:
+                flow[core.NW_DST_N_WILD] = 32 - prefix[1]
+            actions = [[openflow.OFPAT_OUTPUT, [0, outport]]]
+
+            self.install_datapath_flow(dpid, flow, openflow.OFP_FLOW_PERMANENT,
+                                       openflow.OFP_FLOW_PERMANENT, actions, priority=0x7000)
+
+    def baseline_table(self, dpid):
+        """
+        Return the shortest-path rules of switch dpid as {(network, length):
+        outport}, with the host prefixes that leave through the same port
+        aggregated.  The table comes from a single shortest-path search
+        rooted at dpid, without touching the graph's per-destination tree
+        cache, and is computed only once.
+        """
+        if dpid in self.baseline_tables:
+            return self.baseline_tables[dpid]
+
         log.debug("DPID is " + str(dpid))
+        # one Dijkstra from dpid: first_hops[id] is the neighbor of dpid that
+        # the shortest path to node id leaves through, None if unreachable
+        csr = self.g.getCSR()
+        root = csr.index[dpid]
+        first_hops = [None] * csr.size()
+        heap = [(0, root, root)]
+        while len(heap) > 0:
+            (distance, node, first_hop) = heappop(heap)
+            if first_hops[node] is not None:
+                continue
+            first_hops[node] = first_hop
+            for i in xrange(csr.offsets[node], csr.offsets[node + 1]):
+                neighbor = csr.neighbors[i]
+                if first_hops[neighbor] is None:
+                    heappush(heap, (distance + csr.weights[i], neighbor, neighbor if node == root else first_hop))
+
+        hosts_by_port = {}
         for node in self.g.nodes:
-            log.debug("node is " + str(node))
+            hosts = self.g.getClients(node)
+            if not hosts:
+                continue
             if(node == dpid):
-                for host in self.g.getClients(node):
-                    flow[core.NW_DST] = host
-                    actions = [[openflow.OFPAT_OUTPUT, [0, self.portmap[dpid][host]]]]
-
-                    self.install_datapath_flow(dpid, flow, openflow.OFP_FLOW_PERMANENT,
-                                               openflow.OFP_FLOW_PERMANENT, actions, priority=0x7000)
+                for host in hosts:
+                    hosts_by_port.setdefault(self.portmap[dpid][host], []).append(parsePrefix(host))
             else:
-                for host in self.g.getClients(node):
-                    flow[core.NW_DST] = host
-                    actions = [[openflow.OFPAT_OUTPUT,
-                                [0, self.portmap[dpid][self.g.getNextHop(dpid, node)]]]]
-
-                    self.install_datapath_flow(dpid, flow, openflow.OFP_FLOW_PERMANENT,
-                                               openflow.OFP_FLOW_PERMANENT, actions, priority=0x7000)
-
+                first_hop = first_hops[csr.index[node]]
+                if first_hop is None:
+                    continue
+                outport = self.portmap[dpid][csr.labels[first_hop]]
+                hosts_by_port.setdefault(outport, []).extend([parsePrefix(host) for host in hosts])
+
+        table = {}
+        for (outport, prefixes) in hosts_by_port.iteritems():
+            for prefix in aggregatePrefixes(prefixes):
+                table[prefix] = outport
+        self.baseline_tables[dpid] = table
+        return table
 
     def install(self):
         self.register_for_packet_in(self.packet_in_callback)
         self.register_for_datapath_join(self.install_initial_rules)
+
+        worker = threading.Thread(target=self.leq_worker)
+        worker.daemon = True
+        worker.start()
+        self.post_callback(LEQ_POLL_INTERVAL, self.install_finished_jobs)
     
     def getInterface(self):
         return str(COS561Test)
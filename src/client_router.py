@@ -1,47 +1,289 @@
 import graph
+import heapq
+import landmarks
+import random
+import sys
+from array import array
+def decimal_scale(weights):
+	# smallest power of ten, up to a million, that makes every weight whole
+	for digits in xrange(7):
+		scale = 10 ** digits
+		if all(abs(weight * scale - round(weight * scale)) < 1e-6 for weight in weights):
+			break
+	return scale
+
 # need to add support for multiple servers
 class ClientRouter:
-	def __init__(self, graph, servers, id, max_d):
+	def __init__(self, graph, servers, id, max_d, lazy=False, quantum=None):
 		self.graph = graph
 		self.possible_paths = {}
 		self.id = id
 		self.max_d = max_d
-		self.possible_paths = self.bfs(graph, servers)
+		self.lazy = lazy
+		# in lazy mode, lengths can be approximated: every edge weight is
+		# rounded to a whole number of quanta and lengths are reported as
+		# multiples of quantum.  A path of h hops is then within
+		# h * quantum / 2 of its reported length; path_delay() gives the
+		# exact one.  Clients are admitted on their exact shortest path.
+		self.quantum = quantum
+		# lazy mode counts lengths in whole units of 1 / scale (see
+		# get_csr()), over the CSR view in self.scaled; scale is None when
+		# the edge weights are whole already
+		self.scale = None
+		self.scaled = None
+		if lazy:
+			# Only the lengths are computed up front; paths are searched for
+			# when a length is asked for.
+			self.remaining = []
+			self.lengths = self.compute_lengths(graph, servers)
+			return
+		# Paths share their prefixes: path_nodes[i] is the last node of the
+		# path stored at entry i and path_parents[i] the entry holding the
+		# rest of it (-1 at the client).  possible_paths maps each length to
+		# the entries of the paths of that length that end at a server.
+		self.labels = []
+		self.path_nodes = array('l')
+		self.path_parents = array('l')
+		self.possible_paths = self.enumerate_paths(graph, servers)
 
 	def get_all_possible_path_lengths(self):
+		if self.lazy:
+			return [self.from_units(length) for length in self.lengths]
 		l = self.possible_paths.keys()
 		l.sort()
 		return l
 
 
 	def get_all_paths_of_length(self, length):
-		return self.possible_paths[length]
+		if self.lazy:
+			length = self.to_units(length)
+			return [[self.labels[node] for node in path] for path in self.search_paths(length, False)]
+		return [self.get_path(entry) for entry in self.possible_paths[length]]
+
+	def get_path_of_length(self, length):
+		if self.lazy:
+			length = self.to_units(length)
+			for path in self.search_paths(length, True):
+				return [self.labels[node] for node in path]
+			raise KeyError(length)
+		ls = self.possible_paths[length]
+		return self.get_path(ls[int(random.random() * len(ls))])
+
+	def get_path(self, entry):
+		path = []
+		while entry >= 0:
+			path.append(self.labels[self.path_nodes[entry]])
+			entry = self.path_parents[entry]
+		path.reverse()
+		return path
+
+	def memory_usage(self):
+		# Approximate size of the path tables in bytes, for caches that
+		# keep client routers around.
+		if self.lazy:
+			return sys.getsizeof(self.lengths) + sum([sys.getsizeof(lengths) for lengths in self.remaining])
+		size = sys.getsizeof(self.path_nodes) + sys.getsizeof(self.path_parents)
+		for entries in self.possible_paths.itervalues():
+			size += sys.getsizeof(entries)
+		return size
+
+	def enumerate_paths(self, graph, servers):
+		csr = graph.getCSR()
+		offsets = csr.offsets
+		neighbors = csr.neighbors
+		weights = csr.weights
+		self.labels = csr.labels
+		server_ids = set([csr.index[s] for s in servers if s in csr.index])
+		if not (self.id in csr.index) or len(server_ids) == 0:
+			return {}
+
+		# Distance from every node to its nearest server: a partial path
+		# that cannot reach a server within max_d even along a shortest
+		# path is never expanded.
+		nearest = None
+		for s in server_ids:
+			distances = graph.getDistances(csr.labels[s])
+			if nearest is None:
+				nearest = list(distances)
+			else:
+				for node in xrange(len(nearest)):
+					if distances[node] >= 0 and (nearest[node] < 0 or distances[node] < nearest[node]):
+						nearest[node] = distances[node]
 
-	def bfs (self, graph, servers):
 		possible_paths = {}
-		queue = [([self.id], 0)]
-		while len(queue) > 0:
-			temp = queue.pop(0)
-			#print temp
-			partial_path = temp[0]
-			partial_path_len = temp[1]
-			if partial_path_len > self.max_d:
-				continue
-			node = partial_path[-1]
-			if node in servers:
+		start = csr.index[self.id]
+		if nearest[start] < 0 or nearest[start] > self.max_d:
+			return possible_paths
+		self.path_nodes.append(start)
+		self.path_parents.append(-1)
+		# (entry, last node, length, bitset of the nodes on the path)
+		stack = [(0, start, 0, 1 << start)]
+		while len(stack) > 0:
+			(entry, node, partial_path_len, visited) = stack.pop()
+			if node in server_ids:
 				try:
-					possible_paths[partial_path_len].append(partial_path)
+					possible_paths[partial_path_len].append(entry)
 				except KeyError:
-					possible_paths[partial_path_len] = []
-					possible_paths[partial_path_len].append(partial_path)
-			else:
-				for next_hop in graph.getNeighbors(node):
-					try:
-						idx = partial_path.index(next_hop)
-					except ValueError:
-						queue.append((partial_path + [next_hop], partial_path_len + graph.getEdgeWeight(node, next_hop)))
+					possible_paths[partial_path_len] = [entry]
+				continue
+			for i in xrange(offsets[node], offsets[node + 1]):
+				next_hop = neighbors[i]
+				if (visited >> next_hop) & 1:
+					continue
+				next_len = partial_path_len + weights[i]
+				if nearest[next_hop] < 0 or next_len + nearest[next_hop] > self.max_d:
+					continue
+				self.path_nodes.append(next_hop)
+				self.path_parents.append(entry)
+				stack.append((len(self.path_nodes) - 1, next_hop, next_len, visited | (1 << next_hop)))
 		return possible_paths
 
+	def get_csr(self):
+		# the CSR view the lazy search runs over.  The length DP sums edge
+		# weights outwards from the servers and the path search subtracts
+		# them going forwards from the client, which only agree exactly on
+		# whole numbers, so fractional weights are counted in units of the
+		# smallest power of ten that makes them whole (they are read from
+		# decimal text), and in quanta when lengths are approximated.
+		if self.scaled is not None:
+			return self.scaled
+		csr = self.graph.getCSR()
+		if self.quantum is not None:
+			self.scale = 1.0 / self.quantum
+		elif csr.weights.typecode == 'l':
+			return csr
+		else:
+			self.scale = decimal_scale(csr.weights)
+		weights = array('l', [int(round(weight * self.scale)) for weight in csr.weights])
+		self.scaled = graph.CSRGraph(csr.labels, csr.offsets, csr.neighbors, weights)
+		return self.scaled
+
+	def to_units(self, length):
+		if self.scale is None:
+			return length
+		return int(round(length * self.scale))
+
+	def from_units(self, length):
+		if self.scale is None:
+			return length
+		return length / float(self.scale)
+
+	def compute_lengths(self, graph, servers):
+		csr = self.get_csr()
+		offsets = csr.offsets
+		neighbors = csr.neighbors
+		weights = csr.weights
+		self.labels = csr.labels
+		self.server_ids = set([csr.index[s] for s in servers if s in csr.index])
+		if not (self.id in csr.index) or len(self.server_ids) == 0:
+			return []
+		start = csr.index[self.id]
+		max_d = self.max_d
+		if self.scale is None:
+			from_client = graph.getDistances(self.id)
+		else:
+			# whether the client is admitted at all depends on its exact
+			# shortest path, not on how its edge weights round
+			exact = graph.getDistances(self.id)
+			server = min(self.server_ids, key=lambda s: exact[s] if exact[s] >= 0 else float('inf'))
+			if exact[server] < 0 or exact[server] > self.max_d:
+				return []
+			from_client = landmarks.csrDistances(csr, start)
+			# allow for rounding of paths exactly max_d long, and for the
+			# rounded length of the shortest path, which may exceed it
+			max_d = max(self.max_d * self.scale, self.rounded_length(graph, csr, self.id, csr.labels[server])) + 1e-6
+
+		# self.remaining[node] is the set of lengths of the walks from node
+		# that stop at the first server they reach and fit within max_d
+		# after the shortest path from the client to node.  It is built in
+		# order of increasing length from the servers outwards, so there is
+		# at most one state per (node, length) pair.
+		self.remaining = [set() for node in xrange(csr.size())]
+		heap = []
+		for s in self.server_ids:
+			if from_client[s] >= 0 and from_client[s] <= max_d:
+				self.remaining[s].add(0)
+				heap.append((0, s))
+		heapq.heapify(heap)
+		while len(heap) > 0:
+			(length, node) = heapq.heappop(heap)
+			if node in self.server_ids and length > 0:
+				continue
+			for i in xrange(offsets[node], offsets[node + 1]):
+				prev = neighbors[i]
+				if prev in self.server_ids or from_client[prev] < 0:
+					continue
+				prev_len = length + weights[i]
+				if prev_len + from_client[prev] > max_d or prev_len in self.remaining[prev]:
+					continue
+				self.remaining[prev].add(prev_len)
+				heapq.heappush(heap, (prev_len, prev))
+
+		# Walks may revisit nodes, so keep only the lengths that a simple
+		# path actually has.
+		return [length for length in sorted(self.remaining[start])
+				if any(True for path in self.search_paths(length, False))]
+
+	def rounded_length(self, graph, csr, node, server):
+		# length in units of the shortest path from node to server
+		length = 0
+		while node != server:
+			next_hop = graph.getNextHop(node, server)
+			for i in xrange(csr.offsets[csr.index[node]], csr.offsets[csr.index[node] + 1]):
+				if csr.neighbors[i] == csr.index[next_hop]:
+					length += csr.weights[i]
+					break
+			node = next_hop
+		return length
+
+	def path_delay(self, path):
+		# exact length of a path, from the unrounded edge weights
+		return sum([self.graph.getEdgeWeight(path[i], path[i + 1]) for i in xrange(len(path) - 1)])
+
+	def search_paths(self, length, shuffle):
+		csr = self.get_csr()
+		offsets = csr.offsets
+		neighbors = csr.neighbors
+		weights = csr.weights
+		start = csr.index[self.id]
+		if not (length in self.remaining[start]):
+			return
+		# Depth-first search that only steps to a neighbor if the length
+		# left over is one of the lengths the neighbor can still reach a
+		# server with.
+		path = [start]
+		visited = 1 << start
+		stack = [(start, length, self.next_hops(start, length, visited, shuffle))]
+		while len(stack) > 0:
+			(node, left, hops) = stack[-1]
+			step = None
+			if hops is not None:
+				step = next(hops, None)
+			elif left == 0:
+				yield list(path)
+			if step is None:
+				stack.pop()
+				path.pop()
+				visited &= ~(1 << node)
+				continue
+			(next_hop, next_left) = step
+			path.append(next_hop)
+			visited |= 1 << next_hop
+			stack.append((next_hop, next_left, self.next_hops(next_hop, next_left, visited, shuffle)))
+
+	def next_hops(self, node, left, visited, shuffle):
+		if node in self.server_ids:
+			return None
+		csr = self.get_csr()
+		hops = []
+		for i in xrange(csr.offsets[node], csr.offsets[node + 1]):
+			next_hop = csr.neighbors[i]
+			next_left = left - csr.weights[i]
+			if not ((visited >> next_hop) & 1) and next_left in self.remaining[next_hop]:
+				hops.append((next_hop, next_left))
+		if shuffle:
+			random.shuffle(hops)
+		return iter(hops)
 
 if __name__ == '__main__':
 	server = {4}
@@ -60,7 +302,3 @@ if __name__ == '__main__':
 			print "Length %d" % blah
 			print r.get_all_paths_of_length(blah)
 			print "\n"
-
-
-
-
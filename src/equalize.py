@@ -1,18 +1,22 @@
 import service
 import graph
+import router_cache
 
 class EqualizedFlow:
-	def __init__(self, graph):
+	def __init__(self, graph, cache=None):
 		self.graph = graph
 		self.services = {}
+		# client routers are shared across services; None uses the
+		# process-wide cache
+		self.cache = cache
 
 	'''def registerService(self, service_id, servers, max_allowable_delay, max_allowable_difference):
 		if service_id not in services:
 			services[service_id] = service(service_id, servers, max_allowable_delay, max_allowable_difference)'''
 
-	def registerService(self, servers, service_id, max_allowable_delay, max_allowable_difference):
+	def registerService(self, servers, service_id, max_allowable_delay, max_allowable_difference, lazy=False, approximate=None):
 		if not (service_id in self.services):
-			self.services[service_id] = service.Service(service_id, servers, max_allowable_delay, max_allowable_difference)
+			self.services[service_id] = service.Service(service_id, servers, max_allowable_delay, max_allowable_difference, lazy, self.cache, approximate)
 
 	def addClients(self, service_id, clients):
 		if not (service_id in self.services):
@@ -36,6 +40,11 @@ class EqualizedFlow:
 	def getUpdatedClients(self, service_id):
 		return self.services[service_id].get_changed_clients()
 
+	def getCacheStats(self):
+		if self.cache is None:
+			return router_cache.shared_cache.get_stats()
+		return self.cache.get_stats()
+
 
 	#def computeEqualizedPaths(self, s, service_id):
 
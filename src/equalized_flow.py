@@ -10,19 +10,83 @@ incremental addition of clients to a service.
 """
 
 
+import bisect
 import heapq
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
 import graph
+import landmarks
+from array import array
+
+# How many joins outside the tolerance bidirectionalSearch() tries per new
+# half-path and direction while looking for the closest one so far.
+JOIN_PROBES = 4
+
+# EqualizedFlow of a recomputeServices() worker process, over the graph
+# loaded from the snapshot it was given.
+worker_flow = None
+
+def initWorker(snapshot, max_expansions, time_budget, num_landmarks, search, approximate):
+    """
+    Set up a recomputeServices() worker: load the shared graph snapshot.
+    """
+    global worker_flow
+    worker_flow = EqualizedFlow(graph.loadGraphFromFile(snapshot),
+        max_expansions, time_budget, num_landmarks, search, approximate)
+
+def equalizeWorker(task):
+    """
+    Re-equalize one service in a worker process.  task is (server,
+    service_id, service settings, clients, current paths).  Return
+    (server, service_id, max_latency, changed paths and their lengths,
+    clients that can no longer reach the server).
+    """
+    (server, service_id, settings, clients, old_paths) = task
+    return worker_flow.equalizeService(server, service_id, settings, clients, old_paths)
 
 class EqualizedFlow:
-    def __init__(self, g):
+    def __init__(self, g, max_expansions=None, time_budget=None, num_landmarks=None,
+                 search='pfs', approximate=None):
         """
         g - graph
+        max_expansions - most partial paths a single path search may
+            expand, or None for no limit
+        time_budget - most seconds a single addClients() call may spend
+            searching for equalized paths, or None for no limit
+        num_landmarks - if given, path searches prune with lower bounds
+            from a landmark oracle with this many landmarks (see
+            landmarks.py) instead of exact distances to the server
+        search - 'pfs' to search forward from the client (see PFS()), or
+            'bidirectional' to join half-paths grown from both ends (see
+            bidirectionalSearch())
+        approximate - if given, PFS() runs in approximate mode: it keeps
+            one partial path per node and length bucket, where buckets are
+            approximate * MAX_MDD wide
+
+        When a budget runs out, the best path found so far is used.
         """
         self.g = g
         self.services = {}
         self.paths = {}
+        # self.lengths[(server, service_id)][c] is the length of
+        # self.paths[(server, service_id)][c], as of topology version
+        # self.version of g
+        self.lengths = {}
+        self.version = g.getVersion()
         self.clients = {}
         self.__changed__ = {}
+        self.max_expansions = max_expansions
+        self.time_budget = time_budget
+        self.deadline = None
+        self.search_stats = {}
+        self.search = search
+        self.approximate = approximate
+        self.oracle = None
+        if num_landmarks is not None:
+            self.oracle = landmarks.LandmarkOracle(g, num_landmarks)
 
     def registerService(self, server, service_id, DD_tolerance, L_overhead):
         """
@@ -40,6 +104,7 @@ class EqualizedFlow:
             'L_overhead' : L_overhead, 'DD_tolerance': DD_tolerance}
         self.clients[(server, service_id)] = set()
         self.paths[(server, service_id)] = {}
+        self.lengths[(server, service_id)] = {}
 
     def addClients(self, server, service_id, clients):
         """
@@ -53,12 +118,15 @@ class EqualizedFlow:
         if not (server, service_id) in self.services:
             return False
 
+        self.__refreshLengths__()
         self.__changed__[(server, service_id)] = set()
 
         added_new_clients = False
         for c in clients:
             if c in self.clients[(server, service_id)]:
                 continue
+            if self.g.getDistance(c, server) is None:
+                continue    # no path at all, so the walk below would never end
 
             # Add c to the client list and set its path to shortest path
             added_new_clients = True
@@ -70,14 +138,18 @@ class EqualizedFlow:
                 self.paths[(server, service_id)][c].append(curr)
             self.__changed__[(server, service_id)].add(c)
             
-            length = self.pathLength(server, service_id, c)
+            length = self.g.getDistance(c, server)
+            self.lengths[(server, service_id)][c] = length
             L_overhead = self.services[(server, service_id)]['L_overhead']
             self.services[(server, service_id)]['max_latency'] = max(
                 self.services[(server, service_id)]['max_latency'],
                 L_overhead * length)
 
         if added_new_clients:
+            if self.time_budget is not None:
+                self.deadline = time.time() + self.time_budget
             self.computeEqualizedPaths(server, service_id)
+            self.deadline = None
 
         return True
 
@@ -96,6 +168,86 @@ class EqualizedFlow:
             return set()
         return self.__changed__[(server, service_id)]
 
+    def recomputeServices(self, services, processes=None, snapshot=None):
+        """
+        Recompute the equalized paths of each (server, service_id) in
+        services from scratch, e.g. after the topology changed.  Services
+        are independent, so they are spread over a pool of processes
+        (processes=None uses one per CPU).  The workers share the graph
+        through a snapshot file (see graph.saveGraphToFile): snapshot names
+        an up-to-date one, otherwise a temporary one is written.  Workers
+        only send back the paths that changed.
+
+        Return a dict mapping each service to the set of clients whose
+        path changed, which getUpdatedClients() also returns afterwards.
+        """
+        services = [key for key in services if key in self.services]
+        tasks = [(server, service_id, self.services[(server, service_id)],
+                  list(self.clients[(server, service_id)]),
+                  self.paths[(server, service_id)])
+                 for (server, service_id) in services]
+        if len(tasks) == 0:
+            return {}
+
+        temporary = None
+        if snapshot is None:
+            (fd, temporary) = tempfile.mkstemp(suffix='.snapshot')
+            os.close(fd)
+            graph.saveGraphToFile(self.g, temporary)
+            snapshot = temporary
+        try:
+            num_landmarks = None
+            if self.oracle is not None:
+                num_landmarks = self.oracle.num_landmarks
+            pool = multiprocessing.Pool(processes, initWorker,
+                (snapshot, self.max_expansions, self.time_budget, num_landmarks,
+                 self.search, self.approximate))
+            try:
+                results = pool.map(equalizeWorker, tasks)
+            finally:
+                pool.close()
+                pool.join()
+        finally:
+            if temporary is not None:
+                os.remove(temporary)
+
+        self.__refreshLengths__()
+        updated = {}
+        for (server, service_id, max_latency, changed, unreachable) in results:
+            key = (server, service_id)
+            self.services[key]['max_latency'] = max_latency
+            for c in unreachable:
+                self.clients[key].discard(c)
+                self.paths[key].pop(c, None)
+                self.lengths[key].pop(c, None)
+            for c in changed:
+                (self.paths[key][c], self.lengths[key][c]) = changed[c]
+            self.__changed__[key] = set(changed)
+            updated[key] = self.__changed__[key]
+        return updated
+
+    def equalizeService(self, server, service_id, settings, clients, old_paths):
+        """
+        Equalize the paths of clients to server from scratch as a fresh
+        service with the given settings, and compare them to old_paths.
+        Return (server, service_id, max_latency, {client: (path, length)}
+        for each path that differs, clients with no path to server).
+        """
+        key = (server, service_id)
+        for table in (self.services, self.clients, self.paths, self.lengths, self.__changed__):
+            table.pop(key, None)
+        self.registerService(server, service_id, settings['DD_tolerance'],
+            settings['L_overhead'])
+        self.addClients(server, service_id, clients)
+
+        changed = {}
+        for c in self.paths[key]:
+            if old_paths.get(c) != self.paths[key][c]:
+                changed[c] = (self.paths[key][c], self.lengths[key][c])
+        unreachable = [c for c in clients if not (c in self.paths[key])]
+        return (server, service_id, self.services[key]['max_latency'],
+                changed, unreachable)
+
 
     def computeEqualizedPaths(self, s, service_id):
         """
@@ -105,20 +257,31 @@ class EqualizedFlow:
 
         max_latency = self.services[(s, service_id)]['max_latency']
         self.MAX_MDD = self.services[(s, service_id)]['DD_tolerance'] * max_latency
+        lengths = self.lengths[(s, service_id)]
+
+        # Heaps of (length, client) and (-length, client).  Only the min
+        # client's path changes in each iteration, so instead of removing
+        # its old entries they are skipped once they no longer match.
+        min_heap = [(lengths[c], c) for c in self.clients[(s, service_id)]]
+        max_heap = [(-lengths[c], c) for c in self.clients[(s, service_id)]]
+        heapq.heapify(min_heap)
+        heapq.heapify(max_heap)
         while True:
         
             # Find clients with max and min delays
 
             # min_node is client with min delay; max_node is client with max delay
-            min_node = min(self.clients[(s, service_id)], 
-                    key=lambda c: self.pathLength(s, service_id, c))
-            max_node = max(self.clients[(s, service_id)], 
-                    key=lambda c: self.pathLength(s, service_id, c))
+            while min_heap[0][0] != lengths[min_heap[0][1]]:
+                heapq.heappop(min_heap)
+            while -max_heap[0][0] != lengths[max_heap[0][1]]:
+                heapq.heappop(max_heap)
+            min_node = min_heap[0][1]
+            max_node = max_heap[0][1]
 
             # calculating delay as path length
             # find lengths for min_node and max_node
-            min_delay = self.pathLength(s, service_id, min_node)
-            max_delay = self.pathLength(s, service_id, max_node)
+            min_delay = lengths[min_node]
+            max_delay = lengths[max_node]
             
             # maximum delay difference is difference between shortest and longest 'shortest paths'
             mdd = max_delay - min_delay
@@ -135,6 +298,7 @@ class EqualizedFlow:
             self.isDone = False
             self.best_dd = mdd
             self.best_path = []
+            self.best_len = min_delay
 
             # hoping to increase path from min_node to get it closer to max_delay
             self.closestDelayPath(min_node, s)
@@ -143,49 +307,128 @@ class EqualizedFlow:
                 return
 
             self.paths[(s, service_id)][min_node] = self.best_path
+            lengths[min_node] = self.best_len
+            heapq.heappush(min_heap, (self.best_len, min_node))
+            heapq.heappush(max_heap, (-self.best_len, min_node))
             self.__changed__[(s, service_id)].add(min_node)
 
 
-    def closestDelayPath(self, client, server):
+    def closestDelayPath(self, client, server, max_expansions=None, deadline=None):
         """
         Find a path from client to server that is within self.MAX_MDD of 
         self.target_len. If no such paths exist, return the one with length 
         closest to self.target_len and does not exceed self.cutoff_len.
         The path is stored in self.best_path[(server, service_id)][client]
+
+        The search is anytime: it stops after max_expansions partial paths
+        or at time deadline (defaulting to self.max_expansions and the
+        deadline of the current addClients() call), leaving the best path
+        found so far in self.best_path.  See getSearchStats().
         """
+        if max_expansions is None:
+            max_expansions = self.max_expansions
+        if deadline is None:
+            deadline = self.deadline
         #self.DFS(client, server, [], set(), 0)
-        self.PFS(client, server)
+        if self.search == 'bidirectional':
+            self.bidirectionalSearch(client, server, max_expansions, deadline)
+        else:
+            self.PFS(client, server, max_expansions, deadline)
+
+    def getSearchStats(self):
+        """
+        Return statistics about the last path search: 'expansions' (partial
+        paths expanded), 'elapsed' (seconds), 'best_dd' (how far the best
+        path found is from the target length), 'tolerance' (self.MAX_MDD)
+        and 'status', which is 'found' if a path within the tolerance was
+        found, 'exhausted' if every path was searched, or 'budget' if the
+        search was cut short.
+        """
+        return self.search_stats
 
-    def PFS(self, client, server):
+    def PFS(self, client, server, max_expansions=None, deadline=None):
         """
         Run priority-first search from client, first exploring paths that
         have length close to self.target_len.
         Return a path from client to server that is within self.MAX_MDD of
         self.target_len. If no such paths exist, return the one with latency
         closest to self.target_len.
+        Stop early after max_expansions expansions or at time deadline.
+
+        In approximate mode, a partial path is dropped if an earlier one
+        reached the same node with a length in the same bucket, i.e. within
+        quantum = self.approximate * self.MAX_MDD of it.  Lengths are still
+        tracked exactly, so a path found within self.MAX_MDD of the target
+        really is.  This is a heuristic without a bound on what it loses:
+        the kept partial path may have visited nodes the dropped one had
+        not, so extensions of the dropped one, including the closest path
+        overall, can be out of reach of the search.
         """
+        start_time = time.time()
+        expansions = 0
+        status = 'exhausted'
+
+        csr = self.g.getCSR()
+        offsets = csr.offsets
+        neighbors = csr.neighbors
+        weights = csr.weights
+        # shortest path distance (or a lower bound on it) from every node
+        # id to the server
+        if self.oracle is not None:
+            spdists = self.oracle.lowerBounds(server)
+        else:
+            spdists = self.g.getDistances(server)
+        server_id = csr.index[server]
+
+        # Partial paths share their prefixes: path_nodes[e] is the last node
+        # of the path stored at entry e and path_parents[e] the entry
+        # holding the rest of it.  Heap items are (dd, entry, path length,
+        # bitmask of the nodes on the path).
+        path_nodes = array('l', [csr.index[client]])
+        path_parents = array('l', [-1])
+        best_entry = -1
+
+        # (node, length bucket) states already reached in approximate mode
+        quantum = None
+        if self.approximate is not None and self.MAX_MDD > 0:
+            quantum = self.approximate * self.MAX_MDD
+            reached = set()
 
         heap = []
-        heapq.heappush(heap, (self.target_len, [client], 0))
+        heapq.heappush(heap, (self.target_len, 0, 0, 1 << csr.index[client]))
         while len(heap) > 0:
-            dd, path, path_len = heapq.heappop(heap)
+            if max_expansions is not None and expansions >= max_expansions:
+                status = 'budget'
+                break
+            # checking the clock on every expansion would cost more than
+            # the expansion itself
+            if deadline is not None and expansions % 64 == 0 and time.time() >= deadline:
+                status = 'budget'
+                break
+            expansions += 1
+
+            dd, entry, path_len, visited = heapq.heappop(heap)
 
             # the most recent node
-            node = path[-1]
+            node = path_nodes[entry]
             
-            if node == server:
+            if node == server_id:
                 if dd < self.best_dd: 
-                    self.best_dd, self.best_path = dd, path
+                    self.best_dd = dd
+                    self.best_len = path_len
+                    best_entry = entry
                 if dd < self.MAX_MDD:
-                    return      # found path with tolerable delay difference
+                    status = 'found'
+                    break       # found path with tolerable delay difference
                 continue
 
-            for a in self.g.getNeighbors(node):
+            for i in xrange(offsets[node], offsets[node + 1]):
+                a = neighbors[i]
                 # we can comment this part out because we may want to use
                 # different ports to lengthen the path. It will allow
                 # cycles but those will get pruned because of the cutoff_len
 
-                if a in path:
+                if (visited >> a) & 1:
                     continue    # a already visited
                 
                 # still we don't want it going backwards because we can't
@@ -201,19 +444,196 @@ class EqualizedFlow:
                 # then we need to make sure that if the previous nodes are the same,
                 # then the future nodes are the same
 
-                new_len = path_len + self.g.getEdgeWeight(node, a)
-                spdist = self.g.getDistance(a, server)
-                if new_len + spdist > self.cutoff_len:
+                new_len = path_len + weights[i]
+                spdist = spdists[a]
+                if spdist < 0 or new_len + spdist > self.cutoff_len:
                     continue    # path pruned
 
+                if quantum is not None:
+                    state = (a, int(new_len / quantum))
+                    if state in reached:
+                        continue    # an earlier path got here with about the same length
+                    reached.add(state)
+
                 new_dd = abs(self.target_len - new_len)
-                new_path = list(path)
-                new_path.append(a)
+                path_nodes.append(a)
+                path_parents.append(entry)
 
-                heapq.heappush(heap, (new_dd, new_path, new_len))
+                heapq.heappush(heap, (new_dd, len(path_nodes) - 1, new_len, visited | (1 << a)))
 
+        if best_entry >= 0:
+            path = []
+            while best_entry >= 0:
+                path.append(csr.labels[path_nodes[best_entry]])
+                best_entry = path_parents[best_entry]
+            path.reverse()
+            self.best_path = path
+
+        self.search_stats = {'expansions': expansions,
+            'elapsed': time.time() - start_time, 'best_dd': self.best_dd,
+            'tolerance': self.MAX_MDD, 'status': status}
+
+
+    def bidirectionalSearch(self, client, server, max_expansions=None, deadline=None):
+        """
+        Meet-in-the-middle search for a path from client to server that is
+        within self.MAX_MDD of self.target_len.  Every such path has a first
+        node whose distance along the path from client exceeds half the
+        target length: the path splits there into a forward half-path from
+        client of more than half the target length (ending with the edge
+        that crosses the middle) and a backward half-path from server
+        shorter than half the target length plus self.MAX_MDD.  Half-paths
+        are grown depth-first from both ends in turn and indexed by the node
+        they end at and their length; each new one is joined with the
+        half-paths from the other end at the same node that do not share
+        another node with it.  Neither side goes deeper than about half the
+        target length.
+
+        The closest join so far is kept as the best path, so the search is
+        anytime like PFS().  It stops at the first join within
+        self.MAX_MDD of the target.  If it runs through half of
+        max_expansions first, PFS() continues with the rest of the budget
+        and only replaces the best path with a closer one.  If the half-paths
+        run out, no path is within self.MAX_MDD of the target, and the
+        closest join is kept.
+        """
+        start_time = time.time()
+        csr = self.g.getCSR()
+        offsets = csr.offsets
+        neighbors = csr.neighbors
+        weights = csr.weights
+        client_id = csr.index[client]
+        server_id = csr.index[server]
+        half = self.target_len / 2.0
+        lo = self.target_len - self.MAX_MDD
+        hi = self.target_len + self.MAX_MDD
+        if self.oracle is not None:
+            bounds = (self.oracle.lowerBounds(server), self.oracle.lowerBounds(client))
+        else:
+            bounds = (self.g.getDistances(server), self.g.getDistances(client))
+        # how long half-paths from each end may get
+        limits = (half, half + self.MAX_MDD)
+        # the share of the budget for this pass; PFS() gets the rest
+        share = None
+        if max_expansions is not None:
+            share = max_expansions // 2
+
+        # Index 0 is the forward side, from client, and 1 the backward
+        # side, from server.  Half-paths share their prefixes like in PFS():
+        # nodes[d][e] is the last node of the half-path stored at entry e
+        # and parents[d][e] the entry holding the rest of it.  Stack items
+        # and ends[d][node] are (length, entry, bitmask of the nodes on the
+        # half-path); ends only holds forward half-paths that cross the
+        # middle, and is sorted by length.
+        nodes = (array('l', [client_id]), array('l', [server_id]))
+        parents = (array('l', [-1]), array('l', [-1]))
+        stacks = ([(0, 0, 1 << client_id)], [(0, 0, 1 << server_id)])
+        ends = ({}, {})
+        # (dd, length, forward entry, backward entry) of the closest join
+        best = None
+        expansions = 0
+        status = 'exhausted'
+
+        side = 1
+        while len(stacks[0]) > 0 or len(stacks[1]) > 0:
+            if share is not None and expansions >= share:
+                status = 'budget'
+                break
+            if deadline is not None and expansions % 64 == 0 and time.time() >= deadline:
+                status = 'budget'
+                break
+            expansions += 1
+
+            side = 1 - side
+            if len(stacks[side]) == 0:
+                side = 1 - side
+            (path_len, entry, visited) = stacks[side].pop()
+            node = nodes[side][entry]
+
+            if side == 0 and node == server_id:
+                # the whole path fits in the forward half
+                dd = abs(self.target_len - path_len)
+                if best is None or dd < best[0]:
+                    best = (dd, path_len, entry, -1)
+                if dd < self.MAX_MDD:
+                    status = 'found'
+                    break
+                continue
+
+            if side == 1 or path_len > half:
+                # Totals grow with the index into the other side's halves:
+                # scan down and up from the target for the closest join.
+                # Joins within self.MAX_MDD are all tried, the ones beyond
+                # only JOIN_PROBES at a time, to keep a best-so-far cheaply.
+                halves = ends[1 - side].get(node, [])
+                middle = bisect.bisect_right(halves, (self.target_len - path_len, sys.maxint))
+                for (scan, sign) in ((xrange(middle - 1, -1, -1), -1), (xrange(middle, len(halves)), 1)):
+                    probes = 0
+                    for k in scan:
+                        (other_len, other_entry, other_visited) = halves[k]
+                        total = path_len + other_len
+                        dd = sign * (total - self.target_len)
+                        if total > self.cutoff_len or (best is not None and dd >= best[0]):
+                            break
+                        if dd >= self.MAX_MDD:
+                            probes += 1
+                            if probes > JOIN_PROBES:
+                                break
+                        # the halves may only share the node they meet at
+                        if visited & other_visited == 1 << node:
+                            best = (dd, total) + ((entry, other_entry) if side == 0 else (other_entry, entry))
+                            break
+                if best is not None and best[0] < self.MAX_MDD:
+                    status = 'found'
+                    break
+                bisect.insort(ends[side].setdefault(node, []), (path_len, entry, visited))
+                if side == 0 or node == client_id:
+                    continue
+
+            for i in xrange(offsets[node], offsets[node + 1]):
+                a = neighbors[i]
+                if (visited >> a) & 1:
+                    continue
+                new_len = path_len + weights[i]
+                bound = bounds[side][a]
+                if side == 1 and new_len >= limits[1]:
+                    continue
+                # only paths within self.MAX_MDD of the target are looked
+                # for, so prune against that rather than the cutoff
+                if bound < 0 or new_len + bound >= hi or new_len + bound > self.cutoff_len:
+                    continue    # path pruned
+                nodes[side].append(a)
+                parents[side].append(entry)
+                stacks[side].append((new_len, len(nodes[side]) - 1, visited | (1 << a)))
+
+        if best is not None and best[0] < self.best_dd:
+            (dd, total, entry, back_entry) = best
+            path = []
+            while entry >= 0:
+                path.append(csr.labels[nodes[0][entry]])
+                entry = parents[0][entry]
+            path.reverse()
+            if back_entry >= 0:
+                # skip the node the halves meet at, which ends the forward half
+                back_entry = parents[1][back_entry]
+            while back_entry >= 0:
+                path.append(csr.labels[nodes[1][back_entry]])
+                back_entry = parents[1][back_entry]
+            self.best_dd = dd
+            self.best_len = total
+            self.best_path = path
+
+        self.search_stats = {'expansions': expansions,
+            'elapsed': time.time() - start_time, 'best_dd': self.best_dd,
+            'tolerance': self.MAX_MDD, 'status': status}
+
+        if status == 'budget' and (deadline is None or time.time() < deadline):
+            if max_expansions is not None:
+                max_expansions -= expansions
+            self.PFS(client, server, max_expansions, deadline)
+            self.search_stats['expansions'] += expansions
+            self.search_stats['elapsed'] = time.time() - start_time
 
-        
     def DFS(self, node, server, path, visited, current_len):
         """
         Run depth-first search from client.
@@ -222,7 +642,11 @@ class EqualizedFlow:
         closest to self.target_len.
         """
         
-        if current_len + self.g.getDistance(node, server) > self.cutoff_len:
+        if self.oracle is not None:
+            spdist = self.oracle.lowerBound(node, server)
+        else:
+            spdist = self.g.getDistance(node, server)
+        if spdist is None or current_len + spdist > self.cutoff_len:
             return  # pruned
 
         path.append(node)
@@ -232,6 +656,7 @@ class EqualizedFlow:
             curr_dd = abs(self.target_len - current_len)
             if curr_dd < self.best_dd: 
                 self.best_dd, self.best_path = curr_dd, path
+                self.best_len = current_len
             if curr_dd < self.MAX_MDD:
                 self.isDone = True
             return
@@ -248,9 +673,19 @@ class EqualizedFlow:
 
     def pathLength(self, server, service_id, client):
         """
-        Returns the length of the path between any client-server pair
+        Returns the length of the path between any client-server pair,
+        or None if an edge of the path no longer exists
+        """
+        self.__refreshLengths__()
+        if client in self.lengths[(server, service_id)]:
+            return self.lengths[(server, service_id)][client]
+        return self.__edgeLength__(self.paths[(server, service_id)][client])
+
+    def __edgeLength__(self, path):
+        """
+        Returns the sum of the edge weights along path, or None if an edge
+        of the path no longer exists
         """
-        path = self.paths[(server, service_id)][client]
         length = 0
         for i in range(len(path)-1):
             edge_len = self.g.getEdgeWeight(path[i], path[i+1])
@@ -259,6 +694,19 @@ class EqualizedFlow:
             length += edge_len
         return length
 
+    def __refreshLengths__(self):
+        """
+        Recompute the cached path lengths from the current edge weights if
+        the topology of g changed since they were computed.  The paths
+        themselves only change in recomputeServices().
+        """
+        if self.version == self.g.getVersion():
+            return
+        self.version = self.g.getVersion()
+        for key in self.lengths:
+            for c in self.lengths[key]:
+                self.lengths[key][c] = self.__edgeLength__(self.paths[key][c])
+
     def printAllPathLengths(self):
         for (server, service_id) in self.paths:
             print server, service_id
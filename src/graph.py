@@ -7,26 +7,130 @@ graph.py
 Implementation of a graph class. Supports creation of graphs as well as basic
 queries on them, including the shortest path between nodes.
 """
+import bisect
+import hashlib
 import heapq
-import pickle
+import itertools
+import json
+import mmap
+import os
+import socket
+import sys
+import struct
+from array import array
+from collections import OrderedDict
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Header of the binary cache written next to RocketFuel files: magic, format
+# version, size and modification time of the source file, number of nodes,
+# length of the CSR neighbor array and typecode of the CSR weights.  The CSR
+# offsets, neighbors and weights follow as raw arrays, then the node names,
+# one per line.
+ROCKETFUEL_CACHE_MAGIC = 'LEQR'
+ROCKETFUEL_CACHE_VERSION = 2
+ROCKETFUEL_CACHE_HEADER = struct.Struct('=4sIQdIIc')
+
+# Topology versions are drawn from one counter for all graphs, so a version
+# identifies both a graph and the state of its edges.
+TOPOLOGY_VERSIONS = itertools.count(1)
+
+# Default memory budget, in bytes, of the shortest path trees a graph caches.
+TREE_CACHE_BUDGET = 64 * 1024 * 1024
+
+def createRocketFuelGraph(filename, cache=True):
+    'Creates a graph based on the file name given, assuming it is formatted like the RocketFuel files: each line specifies an edge as "node1 node2 weight" (space delimited).  Weights may be fractional, as in the weights.intra files.  Nodes are numbered in the order they appear, and getNodeName gives back the router name of a node.  If cache is True, the parsed edges are saved to filename + ".cache" and later loads of an unchanged file read that instead.'
+    if cache:
+        graph = loadRocketFuelCache(filename)
+        if graph is not None:
+            return graph
 
-def createRocketFuelGraph(filename):
-    'Creates a graph based on the file name given, assuming it is formatted like the RocketFuel files: each line specifies an edge as "node1 node2 weight" (space delimited).'
-    file = open(filename)
-    lines = file.readlines()
     graph = Graph()
     nodemap = {}
-    nextnode = 0
-    for line in lines:
-        [name1, name2, weight] = line.split(' ')
+    file = open(filename)
+    for line in file:
+        fields = line.split()
+        if len(fields) != 3:
+            continue
+        [name1, name2, weight] = fields
         if not (name1 in nodemap):
-            nodemap[name1] = nextnode
-            nextnode += 1
+            nodemap[name1] = len(nodemap)
+            graph.setNodeName(nodemap[name1], name1)
         if not (name2 in nodemap):
-            nodemap[name2] = nextnode
-            nextnode += 1
-        graph.addEdge(nodemap[name1], nodemap[name2], int(weight))
-        
+            nodemap[name2] = len(nodemap)
+            graph.setNodeName(nodemap[name2], name2)
+        graph.addEdge(nodemap[name1], nodemap[name2], toWeight(float(weight)))
+    file.close()
+
+    if cache:
+        saveRocketFuelCache(filename, graph)
+    return graph
+
+def toWeight(weight):
+    'Returns the weight as an int if it is integral, so that graphs with integer weights keep integer path lengths.'
+    if isinstance(weight, float) and weight.is_integer():
+        return int(weight)
+    return weight
+
+def saveRocketFuelCache(filename, graph):
+    'Writes the CSR view of a graph parsed from a RocketFuel file to its binary cache.  Failure to write the cache is not an error.'
+    stat = os.stat(filename)
+    csr = graph.getCSR()
+    names = [graph.getNodeName(node) for node in csr.labels]
+    try:
+        file = open(filename + '.cache', 'wb')
+        file.write(ROCKETFUEL_CACHE_HEADER.pack(ROCKETFUEL_CACHE_MAGIC, ROCKETFUEL_CACHE_VERSION,
+                                                stat.st_size, stat.st_mtime, len(names), len(csr.neighbors),
+                                                csr.weights.typecode))
+        csr.offsets.tofile(file)
+        csr.neighbors.tofile(file)
+        csr.weights.tofile(file)
+        file.write('\n'.join(names))
+        file.close()
+    except (IOError, OSError):
+        pass
+
+def loadRocketFuelCache(filename):
+    'Creates a graph from the binary cache of a RocketFuel file.  Like a snapshot, the graph starts out with only the CSR view, and builds its adjacency dictionaries the first time they are needed.  Returns None if there is no cache or it does not match the file.'
+    try:
+        stat = os.stat(filename)
+        file = open(filename + '.cache', 'rb')
+    except (IOError, OSError):
+        return None
+    try:
+        header = file.read(ROCKETFUEL_CACHE_HEADER.size)
+        if len(header) != ROCKETFUEL_CACHE_HEADER.size:
+            return None
+        (magic, version, size, mtime, num_nodes, num_neighbors, typecode) = ROCKETFUEL_CACHE_HEADER.unpack(header)
+        if (magic != ROCKETFUEL_CACHE_MAGIC or version != ROCKETFUEL_CACHE_VERSION or
+            size != stat.st_size or mtime != stat.st_mtime):
+            return None
+        offsets = array('l')
+        neighbors = array('l')
+        weights = array(typecode)
+        offsets.fromfile(file, num_nodes + 1)
+        neighbors.fromfile(file, num_neighbors)
+        weights.fromfile(file, num_neighbors)
+        names = file.read().split('\n')
+    except EOFError:
+        return None
+    finally:
+        file.close()
+    if len(names) != num_nodes:
+        return None
+
+    # Nodes are numbered in the order they appear in the file, which is
+    # also the order the parsed graph gave them ids in.
+    graph = Graph()
+    graph.__labels__ = range(num_nodes)
+    graph.__csr__ = CSRGraph(graph.__labels__, offsets, neighbors, weights)
+    graph.__ids__ = dict(graph.__csr__.index)
+    graph.__adjacency__ = None
+    for node in xrange(num_nodes):
+        graph.setNodeName(node, names[node])
     return graph
 
 def createAbileneGraph():
@@ -80,44 +184,324 @@ def createSampleGraph():
 
     return graph
 
-def saveGraphToFile(graph, filename):
-    file = open(filename, 'w')
-    pickle.dump(graph, file)
+def ipToInt(ip):
+    'Converts a dotted-quad ip address string to an integer.'
+    return struct.unpack('!I', socket.inet_aton(ip))[0]
+
+def parsePrefix(prefix):
+    'Splits a prefix of the form "a.b.c.d/len" into its network address (as an integer, with host bits cleared) and length.  A bare ip address is a /32 prefix.'
+    if '/' in prefix:
+        [ip, length] = prefix.split('/')
+        length = int(length)
+    else:
+        ip = prefix
+        length = 32
+    mask = (0xffffffff << (32 - length)) & 0xffffffff
+    return (ipToInt(ip) & mask, length)
+
+def aggregatePrefixes(prefixes):
+    'Merges (network, length) prefixes into the fewest prefixes covering exactly the same addresses.'
+    blocks = {}
+    for (network, length) in sorted(set(prefixes), key=lambda prefix: prefix[1]):
+        # Drop prefixes inside one we already have.
+        covered = False
+        for shorter in xrange(length):
+            mask = (0xffffffff << (32 - shorter)) & 0xffffffff
+            if network & mask in blocks.get(shorter, ()):
+                covered = True
+                break
+        if not covered:
+            blocks.setdefault(length, set()).add(network)
+
+    # Merge sibling prefixes into their parent, from the longest up.
+    for length in xrange(32, 0, -1):
+        networks = blocks.get(length)
+        if not networks:
+            continue
+        bit = 1 << (32 - length)
+        for network in sorted(networks):
+            if not network & bit and network | bit in networks:
+                networks.discard(network)
+                networks.discard(network | bit)
+                blocks.setdefault(length - 1, set()).add(network)
+
+    return sorted((network, length) for (length, networks) in blocks.iteritems()
+                  for network in networks)
+
+# A graph snapshot starts with this header: magic, format version and the
+# length of the JSON metadata that follows it.  The metadata describes the
+# nodes, clients and port map, and gives the offset, length and typecode of
+# each array section; the sections follow the metadata, 8-byte aligned and in
+# native byte order, so they can be read straight out of a memory map.
+SNAPSHOT_MAGIC = 'LEQG'
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct('=4sIQ')
+
+def saveGraphToFile(graph, filename, allpairs=False):
+    'Saves the graph to a snapshot file: its adjacency, clients, router names, port map and, if they have been computed (or allpairs is True), the all-pairs shortest path matrices.'
+    csr = graph.getCSR()
+    sections = [('offsets', csr.offsets), ('neighbors', csr.neighbors), ('weights', csr.weights)]
+    if allpairs and graph.__allpairs__ is None:
+        graph.precomputeAllPairs()
+    if graph.__allpairs__ is not None:
+        sections.append(('distances', graph.__allpairs__[0]))
+        sections.append(('nexthops', graph.__allpairs__[1]))
+
+    metadata = {'byteorder': sys.byteorder, 'labels': csr.labels, 'sections': {},
+                'names': graph.names.items(),
+                'clients': graph.clients.items(),
+                'prefixes': [(length, network, graph.__prefixes__[length][network])
+                             for length in graph.__prefixes__
+                             for network in graph.__prefixes__[length]],
+                'portmap': [(node, key, port)
+                            for (node, ports) in graph.getPortMap().iteritems()
+                            for (key, port) in ports.iteritems()]}
+    blobs = []
+    offset = 0
+    for (name, values) in sections:
+        if isinstance(values, array):
+            (typecode, shape, data) = (values.typecode, [len(values)], values.tostring())
+        else:
+            (typecode, shape, data) = (values.dtype.str, list(values.shape), values.tostring())
+        metadata['sections'][name] = (offset, len(data), typecode, shape)
+        padding = -len(data) % 8
+        blobs.append(data + '\0' * padding)
+        offset += len(data) + padding
+
+    encoded = json.dumps(metadata)
+    start = SNAPSHOT_HEADER.size + len(encoded)
+    encoded += ' ' * (-start % 8)
+    file = open(filename, 'wb')
+    file.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(encoded)))
+    file.write(encoded)
+    for blob in blobs:
+        file.write(blob)
     file.close()
 
 def loadGraphFromFile(filename):
-    file = open(filename)
-    graph = pickle.load(file)
-    file.close()
+    'Loads a graph from a snapshot written by saveGraphToFile.  The file is memory-mapped: adjacency arrays are copied out in bulk, all-pairs matrices are used in place (when numpy is available), and the adjacency dictionaries are only built if something asks for them.  Raises ValueError if the file is not a snapshot this version can read.'
+    file = open(filename, 'rb')
+    try:
+        data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    finally:
+        file.close()
+    if len(data) < SNAPSHOT_HEADER.size:
+        raise ValueError('%s is not a graph snapshot' % filename)
+    (magic, version, length) = SNAPSHOT_HEADER.unpack(data[:SNAPSHOT_HEADER.size])
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError('%s is not a graph snapshot' % filename)
+    if version != SNAPSHOT_VERSION:
+        raise ValueError('%s has unsupported snapshot version %d' % (filename, version))
+    start = SNAPSHOT_HEADER.size + length
+    metadata = fromJSON(json.loads(data[SNAPSHOT_HEADER.size:start]))
+    if metadata['byteorder'] != sys.byteorder:
+        raise ValueError('%s was saved with %s-endian byte order' % (filename, metadata['byteorder']))
+
+    def section(name):
+        (offset, size, typecode, shape) = metadata['sections'][name]
+        if len(shape) == 1:
+            values = array(typecode)
+            values.fromstring(data[start + offset:start + offset + size])
+            return values
+        return numpy.frombuffer(data, dtype=typecode, count=shape[0] * shape[1],
+                                offset=start + offset).reshape(shape)
+
+    graph = Graph()
+    graph.__labels__ = metadata['labels']
+    graph.__csr__ = CSRGraph(graph.__labels__, section('offsets'), section('neighbors'), section('weights'))
+    graph.__ids__ = dict(graph.__csr__.index)
+    graph.__adjacency__ = None
+    for (node, name) in metadata['names']:
+        graph.setNodeName(node, name)
+    for (node, ips) in metadata['clients']:
+        for ip in ips:
+            graph.addClient(node, ip)
+    for (length, network, node) in metadata['prefixes']:
+        graph.__prefixes__.setdefault(length, {})[network] = node
+    if numpy is not None and 'distances' in metadata['sections']:
+        graph.__allpairs__ = (section('distances'), section('nexthops'))
+    portmap = {}
+    for (node, key, port) in metadata['portmap']:
+        portmap.setdefault(node, {})[key] = port
+    graph.__portmap__ = portmap
     return graph
 
-class Graph:
+def fromJSON(value):
+    'Converts the unicode strings that json returns back to plain strings.'
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    if isinstance(value, list):
+        return [fromJSON(item) for item in value]
+    if isinstance(value, dict):
+        return dict([(fromJSON(key), fromJSON(item)) for (key, item) in value.iteritems()])
+    return value
+
+def buildCSR(labels, index, nodes):
+    'Builds the CSR view of a graph from its adjacency dictionaries.'
+    offsets = array('l', [0])
+    neighbors = array('l')
+    integral = True
+    weightlist = []
+    for node in labels:
+        adjacent = nodes[node]
+        ids = sorted([index[node2] for node2 in adjacent])
+        for id2 in ids:
+            weight = adjacent[labels[id2]]
+            if not isinstance(weight, (int, long)):
+                integral = False
+            weightlist.append(weight)
+        neighbors.extend(ids)
+        offsets.append(len(neighbors))
+    # Integer weights stay integers so path lengths keep their type.
+    if integral:
+        weights = array('l', weightlist)
+    else:
+        weights = array('d', weightlist)
+    return CSRGraph(labels, offsets, neighbors, weights)
+
+class CSRGraph:
+    'A compact, read-only compressed sparse row (CSR) view of a Graph.  Nodes are numbered with contiguous integer ids; the neighbors of id u are neighbors[offsets[u]:offsets[u+1]], with the matching edge weights in the same slice of weights.'
+
+    def __init__(self, labels, offsets, neighbors, weights):
+        # self.labels[id] is the graph node with the given id, and
+        # self.index[node] is the id of the given graph node.
+        self.labels = list(labels)
+        self.index = dict([(self.labels[i], i) for i in xrange(len(self.labels))])
+        self.offsets = offsets
+        self.neighbors = neighbors
+        self.weights = weights
+
+    def size(self):
+        'Returns the number of nodes in the graph.'
+        return len(self.labels)
+
+class Graph(object):
     'A class that describes an undirected graph, with convenience functions for some common graph operations and a few extensions to deal with router topologies.'
 
-    def __init__(self):
-        # self.nodes[node1][node2] is the edge weight from node1 to node2
-        self.nodes = {}
+    def __init__(self, tree_budget=TREE_CACHE_BUDGET):
+        # self.nodes[node1][node2] is the edge weight from node1 to node2.
+        # Graphs loaded from a snapshot start out with only the CSR view, and
+        # build these dictionaries the first time they are needed.
+        self.__adjacency__ = {}
         # self.clients[node] is a list of client ips attached to node
         self.clients = {}
-        self.__distances__ = {}
-        self.__nexthops__ = {}
+        # self.names[node] is the name of the router a node stands for, if any
+        self.names = {}
+        # self.__clientnodes__[ip] is the node that client ip is attached to
+        self.__clientnodes__ = {}
+        # self.__prefixes__[length][network] is the node that the client
+        # prefix network/length is attached to
+        self.__prefixes__ = {}
+        # Nodes get contiguous integer ids in the order they are first seen,
+        # so ids stay stable as edges are added.
+        self.__labels__ = []
+        self.__ids__ = {}
+        self.__csr__ = None
+        # self.__trees__[root] is a (distances, nexthops) pair of arrays,
+        # where distances[id] and nexthops[id] are the shortest path distance
+        # and next hop id from node id to root.  Trees are kept in order from
+        # least to most recently used, and the least recently used ones are
+        # dropped once they take up more than tree_budget bytes.
+        self.__trees__ = OrderedDict()
+        self.__treebytes__ = 0
+        self.__treebudget__ = tree_budget
+        self.__treestats__ = {'hits': 0, 'misses': 0, 'evictions': 0}
+        # (distances, nexthops) matrices built by precomputeAllPairs, where
+        # distances[root][id] and nexthops[root][id] mirror the per-root arrays.
+        self.__allpairs__ = None
+        self.__portmap__ = None
+        self.__version__ = next(TOPOLOGY_VERSIONS)
+
+    def getAdjacency(self):
+        'Returns the adjacency dictionaries of the graph, where nodes[node1][node2] is the edge weight from node1 to node2.'
+        if self.__adjacency__ is None:
+            csr = self.__csr__
+            adjacency = {}
+            for node in xrange(csr.size()):
+                adjacent = {}
+                for i in xrange(csr.offsets[node], csr.offsets[node + 1]):
+                    adjacent[csr.labels[csr.neighbors[i]]] = toWeight(csr.weights[i])
+                adjacency[csr.labels[node]] = adjacent
+            self.__adjacency__ = adjacency
+        return self.__adjacency__
+
+    nodes = property(getAdjacency)
 
     def addEdge(self, node1, node2, weight):
-        'Creates an undirected edge between node1 and node2 with the given weight.'
+        'Creates an undirected edge between node1 and node2 with the given weight, or changes the weight of an existing edge.  Cached shortest paths are repaired rather than discarded.  Returns the set of (node, root) pairs whose next hop towards root changed.'
+        old_weight = self.getEdgeWeight(node1, node2)
+        if old_weight == weight:
+            return set()
+        if not isinstance(weight, (int, long)):
+            self.__widenDistances__()
         if not (node1 in self.nodes):
-            self.nodes[node1] = {}
+            self.__addNode__(node1)
         self.nodes[node1][node2] = weight
         if not (node2 in self.nodes):
-            self.nodes[node2] = {}
+            self.__addNode__(node2)
         self.nodes[node2][node1] = weight
-        self.__distances__ = {}
-        self.__nexthops__ = {}
+        self.__csr__ = None
+        self.__portmap__ = None
+        self.__version__ = next(TOPOLOGY_VERSIONS)
+        if old_weight is None or weight < old_weight:
+            return self.__repairTrees__(self.__decreaseTree__, node1, node2, weight)
+        return self.__repairTrees__(self.__increaseTree__, node1, node2)
+
+    def removeEdge(self, node1, node2):
+        'Removes the edge between node1 and node2, if there is one.  The nodes themselves stay in the graph.  Cached shortest paths are repaired rather than discarded.  Returns the set of (node, root) pairs whose next hop towards root changed.'
+        if self.getEdgeWeight(node1, node2) is None:
+            return set()
+        del self.nodes[node1][node2]
+        del self.nodes[node2][node1]
+        self.__csr__ = None
+        self.__portmap__ = None
+        self.__version__ = next(TOPOLOGY_VERSIONS)
+        return self.__repairTrees__(self.__increaseTree__, node1, node2)
+
+    def getVersion(self):
+        'Returns the topology version of the graph, which changes whenever an edge is added, reweighted or removed and is never shared with another graph.'
+        return self.__version__
+
+    def getCSR(self):
+        'Returns the CSR view of the graph, rebuilding it if the graph changed since it was last built.'
+        if self.__csr__ is None:
+            self.__csr__ = buildCSR(self.__labels__, self.__ids__, self.nodes)
+        return self.__csr__
 
     def addClient(self, node, ip):
         'Attaches a client with the given ip to the given node.  Has no effect on any non-client graph operations.'
         if not (node in self.clients):
             self.clients[node] = []
         self.clients[node].append(ip)
+        self.__clientnodes__[ip] = node
+        self.__portmap__ = None
+
+    def removeClient(self, node, ip):
+        'Detaches the client with the given ip from the given node, if it is attached there.'
+        if not (ip in self.getClients(node)):
+            return
+        self.clients[node].remove(ip)
+        if not self.clients[node]:
+            del self.clients[node]
+        if self.__clientnodes__.get(ip) == node:
+            del self.__clientnodes__[ip]
+        self.__portmap__ = None
+
+    def addClientPrefix(self, node, prefix):
+        'Attaches every client ip in the given prefix ("a.b.c.d/len") to the given node.  Clients attached individually, or by a longer prefix, take precedence.'
+        (network, length) = parsePrefix(prefix)
+        if not (length in self.__prefixes__):
+            self.__prefixes__[length] = {}
+        self.__prefixes__[length][network] = node
+
+    def removeClientPrefix(self, node, prefix):
+        'Detaches the given client prefix from the given node, if it is attached there.'
+        (network, length) = parsePrefix(prefix)
+        if self.__prefixes__.get(length, {}).get(network) != node:
+            return
+        del self.__prefixes__[length][network]
+        if not self.__prefixes__[length]:
+            del self.__prefixes__[length]
 
     def getClients(self, node):
         'Returns a list of the client ips attached to node.'
@@ -127,18 +511,43 @@ class Graph:
             return self.clients[node]
 
     def getNodeFromClientIP(self, ip):
-        'Returns the node that the client ip is attached to, or none if the client ip has not been attached to any node.'
-        for node in self.clients:
-            if ip in self.clients[node]:
-                return node
+        'Returns the node that the client ip is attached to, or none if the client ip has not been attached to any node.  Individually attached clients are found first, then the longest matching client prefix.'
+        if ip in self.__clientnodes__:
+            return self.__clientnodes__[ip]
+        if not self.__prefixes__:
+            return None
+        address = ipToInt(ip)
+        for length in sorted(self.__prefixes__, reverse=True):
+            mask = (0xffffffff << (32 - length)) & 0xffffffff
+            network = address & mask
+            if network in self.__prefixes__[length]:
+                return self.__prefixes__[length][network]
         return None
 
+    def setNodeName(self, node, name):
+        'Records the name of the router that node stands for.'
+        self.names[node] = name
+
+    def getNodeName(self, node):
+        'Returns the name of the router that node stands for, or None if it has no name.'
+        return self.names.get(node)
+
     def getNodes(self):
         'Returns a list of the nodes in the graph.'
         return self.nodes.keys()
 
     def getEdgeWeight(self, node1, node2):
         'Returns the weight of the edge between node1 and node2, or None if no such edge exists.'
+        if self.__adjacency__ is None:
+            csr = self.__csr__
+            if not (node1 in csr.index) or not (node2 in csr.index):
+                return None
+            node = csr.index[node1]
+            end = csr.offsets[node + 1]
+            i = bisect.bisect_left(csr.neighbors, csr.index[node2], csr.offsets[node], end)
+            if i == end or csr.neighbors[i] != csr.index[node2]:
+                return None
+            return toWeight(csr.weights[i])
         if not (node1 in self.nodes):
             return None
         if not (node2 in self.nodes[node1]):
@@ -147,42 +556,129 @@ class Graph:
 
     def getNeighbors(self, node1):
         'Returns a dictionary where the keys are the neighbors of the node and the values are the weights of the edges to those nodes.'
+        if self.__adjacency__ is None:
+            csr = self.__csr__
+            if not (node1 in csr.index):
+                return {}
+            node = csr.index[node1]
+            neighbors = {}
+            for i in xrange(csr.offsets[node], csr.offsets[node + 1]):
+                neighbors[csr.labels[csr.neighbors[i]]] = toWeight(csr.weights[i])
+            return neighbors
         if not (node1 in self.nodes):
             return {}
         return self.nodes[node1]
 
     def getDistance(self, node1, node2):
         'Returns the shortest path distance from node1 to node2 using.  Computes and caches the shortest path from every node to node2.  Returns None if no path exists.'
-        if not (node1 in self.nodes):
+        if not (node1 in self.__ids__):
             return None
-        if not (node2 in self.nodes):
+        if not (node2 in self.__ids__):
             return None
-        if (node1 in self.__distances__) and (node2 in self.__distances__[node1]):
-            return self.__distances__[node1][node2]
+        if self.__allpairs__ is not None:
+            distance = self.__allpairs__[0][self.__ids__[node2], self.__ids__[node1]].item()
         else:
-            self.runDijkstra(node2)
-            if (node1 in self.__distances__) and (node2 in self.__distances__[node1]):
-                return self.__distances__[node1][node2]
-            else:
-                return None
+            distance = self.getDistances(node2)[self.__ids__[node1]]
+        if distance < 0:
+            return None
+        return distance
 
     def getNextHop(self, node1, node2):
         'Returns the node that would be next after node1 on the shortest path between node1 and node2.  Computes and caches the shortest path from every node to node2.  Returns None if no path exists.'
-        if not (node1 in self.nodes):
+        if not (node1 in self.__ids__):
             return None
-        if not (node2 in self.nodes):
+        if not (node2 in self.__ids__):
             return None
-        if (node1 in self.__nexthops__) and (node2 in self.__nexthops__[node1]):
-            return self.__nexthops__[node1][node2]
+        if self.__allpairs__ is not None:
+            nexthop = self.__allpairs__[1][self.__ids__[node2], self.__ids__[node1]]
         else:
-            self.runDijkstra(node2)
-            if (node1 in self.__nexthops__) and (node2 in self.__nexthops__[node1]):
-                return self.__nexthops__[node1][node2]
-            else:
-                return None
+            nexthop = self.__getTree__(node2)[1][self.__ids__[node1]]
+        if nexthop < 0:
+            return None
+        return self.__labels__[nexthop]
+
+    def getDistances(self, root):
+        'Returns an array, indexed by CSR node id, of the shortest path distance from every node to root.  Unreachable nodes have a negative distance.  Computes and caches the shortest path from every node to root.'
+        if self.__allpairs__ is not None:
+            return self.__allpairs__[0][self.__ids__[root]].tolist()
+        return self.__getTree__(root)[0]
+
+    def precomputeAllPairs(self):
+        'Computes the shortest path distance and next hop between every pair of nodes at once, so that getDistance and getNextHop become array lookups.  Requires numpy.  Like the per-root trees, the matrices are repaired in place when edges change.'
+        if numpy is None:
+            raise ImportError('precomputeAllPairs requires numpy')
+        csr = self.getCSR()
+        n = csr.size()
+
+        # Floyd-Warshall, vectorized over every (node, root) pair for each
+        # intermediate node k.  distances[root][node] is the distance from
+        # node to root and nexthops[root][node] the next node on that path.
+        distances = numpy.empty((n, n))
+        distances.fill(numpy.inf)
+        nexthops = numpy.empty((n, n), dtype=numpy.int32)
+        nexthops.fill(-1)
+        for node in xrange(n):
+            start, end = csr.offsets[node], csr.offsets[node + 1]
+            roots = numpy.frombuffer(csr.neighbors, dtype=numpy.int_)[start:end]
+            distances[roots, node] = numpy.frombuffer(csr.weights, dtype=numpy.dtype(csr.weights.typecode))[start:end]
+            nexthops[roots, node] = roots
+        distances[numpy.arange(n), numpy.arange(n)] = 0
+        nexthops[numpy.arange(n), numpy.arange(n)] = -1
+
+        for k in xrange(n):
+            # going from node to k, then from k to root
+            through = distances[:, k, numpy.newaxis] + distances[numpy.newaxis, k, :]
+            shorter = through < distances
+            distances = numpy.where(shorter, through, distances)
+            nexthops = numpy.where(shorter, nexthops[k, :][numpy.newaxis, :], nexthops)
+
+        unreachable = numpy.isinf(distances)
+        distances[unreachable] = -1
+        if csr.weights.typecode == 'l':
+            distances = distances.astype(numpy.int64)
+        self.__allpairs__ = (distances, nexthops)
+
+    def saveAllPairs(self, filename):
+        'Saves the matrices computed by precomputeAllPairs next to the given topology file, so that loadAllPairs can memory-map them back in.'
+        if self.__allpairs__ is None:
+            self.precomputeAllPairs()
+        numpy.save(filename + '.distances.npy', self.__allpairs__[0])
+        numpy.save(filename + '.nexthops.npy', self.__allpairs__[1])
+        with open(filename + '.fingerprint', 'w') as f:
+            f.write(self.__fingerprint__())
+
+    def loadAllPairs(self, filename):
+        'Memory-maps the matrices saved by saveAllPairs for the same topology.  Returns False if they do not exist or were saved for a different topology.'
+        if numpy is None:
+            return False
+        try:
+            with open(filename + '.fingerprint') as f:
+                if f.read() != self.__fingerprint__():
+                    return False
+            distances = numpy.load(filename + '.distances.npy', mmap_mode='r')
+            nexthops = numpy.load(filename + '.nexthops.npy', mmap_mode='r')
+        except IOError:
+            return False
+        n = len(self.__labels__)
+        if distances.shape != (n, n) or nexthops.shape != (n, n):
+            return False
+        self.__allpairs__ = (distances, nexthops)
+        return True
+
+    def __fingerprint__(self):
+        'Returns a hash of the node labels, edges and edge weights of the graph, which identifies the topology the all-pairs matrices were computed for.'
+        csr = self.getCSR()
+        digest = hashlib.sha1(repr(csr.labels))
+        digest.update(csr.offsets.tostring())
+        digest.update(csr.neighbors.tostring())
+        digest.update(csr.weights.typecode)
+        digest.update(csr.weights.tostring())
+        return digest.hexdigest()
 
     def getPortMap(self):
-        'Returns a dictionary mapping graph edges to the port numbers assigned by mininet assuming graphnet.py is used to create a topology from the graph.'
+        'Returns a dictionary mapping graph edges to the port numbers assigned by mininet assuming graphnet.py is used to create a topology from the graph.  Graphs loaded from a snapshot keep the port map they were saved with.'
+        if self.__portmap__ is not None:
+            return self.__portmap__
         map = {}
         port = {}
 
@@ -213,31 +709,199 @@ class Graph:
                         links[node2] = []
                 links[node2].append(node)
 
+        self.__portmap__ = map
         return map 
 
     def runDijkstra(self, root):
         'Runs Dijkstras algorithm from the given root to find the shortest path distance and next hop from every node to the given root.'
-        heap = [(0, root, None)]
-        distances = {}
-        nexthops = {}
+        csr = self.getCSR()
+        offsets = csr.offsets
+        neighbors = csr.neighbors
+        weights = csr.weights
+        n = csr.size()
+        heap = [(0, csr.index[root], -1)]
+        distances = [None] * n
+        nexthops = array('l', [-1]) * n
 
         while len(heap) > 0:
             (distance, node, nexthop) = heapq.heappop(heap)
-            if node in distances:
+            if distances[node] is not None:
                 continue
 
             distances[node] = distance
             nexthops[node] = nexthop
-            for dst in self.nodes[node]:
-                if not (dst in distances):
-                    heapq.heappush(heap, (distance + self.nodes[node][dst], dst, node))
+            for i in xrange(offsets[node], offsets[node + 1]):
+                dst = neighbors[i]
+                if distances[dst] is None:
+                    heapq.heappush(heap, (distance + weights[i], dst, node))
+
+        if root in self.__trees__:
+            self.__treebytes__ -= self.__treeSize__(self.__trees__.pop(root))
+        tree = (array(weights.typecode, [-1 if d is None else d for d in distances]), nexthops)
+        self.__trees__[root] = tree
+        self.__treebytes__ += self.__treeSize__(tree)
+        # Drop the least recently used trees, but never the one just built.
+        while self.__treebytes__ > self.__treebudget__ and len(self.__trees__) > 1:
+            self.__treebytes__ -= self.__treeSize__(self.__trees__.popitem(last=False)[1])
+            self.__treestats__['evictions'] += 1
+
+    def setTreeBudget(self, tree_budget):
+        'Sets the memory budget, in bytes, of the cached shortest path trees, dropping the least recently used trees that no longer fit.'
+        self.__treebudget__ = tree_budget
+        while self.__treebytes__ > self.__treebudget__ and len(self.__trees__) > 0:
+            self.__treebytes__ -= self.__treeSize__(self.__trees__.popitem(last=False)[1])
+            self.__treestats__['evictions'] += 1
+
+    def getTreeCacheStats(self):
+        'Returns the number of cached shortest path trees, the bytes they take up, the budget, and the hits, misses and evictions of the tree cache so far.'
+        stats = dict(self.__treestats__)
+        stats['trees'] = len(self.__trees__)
+        stats['bytes'] = self.__treebytes__
+        stats['budget'] = self.__treebudget__
+        return stats
+
+    def __getTree__(self, root):
+        'Returns the (distances, nexthops) shortest path tree towards root, computing it if it is not cached, and marks it as the most recently used.'
+        tree = self.__trees__.pop(root, None)
+        if tree is None:
+            self.__treestats__['misses'] += 1
+            self.runDijkstra(root)
+            return self.__trees__[root]
+        self.__treestats__['hits'] += 1
+        self.__trees__[root] = tree
+        return tree
+
+    def __treeSize__(self, tree):
+        'Returns the bytes taken up by the arrays of a shortest path tree.'
+        (distances, nexthops) = tree
+        return len(distances) * distances.itemsize + len(nexthops) * nexthops.itemsize
+
+    def __addNode__(self, node):
+        'Adds an isolated node, giving it the next id and making it unreachable in every cached shortest path tree.'
+        self.nodes[node] = {}
+        self.__ids__[node] = len(self.__labels__)
+        self.__labels__.append(node)
+        for (distances, nexthops) in self.__trees__.itervalues():
+            distances.append(-1)
+            nexthops.append(-1)
+            self.__treebytes__ += distances.itemsize + nexthops.itemsize
+        if self.__allpairs__ is not None:
+            n = len(self.__labels__)
+            (distances, nexthops) = self.__allpairs__
+            grown_distances = numpy.empty((n, n), dtype=distances.dtype)
+            grown_distances.fill(-1)
+            grown_distances[:n - 1, :n - 1] = distances
+            grown_distances[n - 1, n - 1] = 0
+            grown_nexthops = numpy.empty((n, n), dtype=nexthops.dtype)
+            grown_nexthops.fill(-1)
+            grown_nexthops[:n - 1, :n - 1] = nexthops
+            self.__allpairs__ = (grown_distances, grown_nexthops)
+
+    def __widenDistances__(self):
+        'Converts cached integer distances to floating point before a fractional edge weight is added.'
+        for root in self.__trees__:
+            (distances, nexthops) = self.__trees__[root]
+            if distances.typecode == 'l':
+                self.__trees__[root] = (array('d', distances), nexthops)
+                self.__treebytes__ += len(distances) * (array('d').itemsize - distances.itemsize)
+        if self.__allpairs__ is not None:
+            (distances, nexthops) = self.__allpairs__
+            if distances.dtype.kind != 'f':
+                self.__allpairs__ = (distances.astype(numpy.float64), nexthops)
+
+    def __repairTrees__(self, repair, node1, node2, *args):
+        'Applies repair to every cached shortest path tree after the edge between node1 and node2 changed.  Returns the set of (node, root) pairs whose next hop changed.'
+        id1 = self.__ids__[node1]
+        id2 = self.__ids__[node2]
+        changed = set()
+        for (root, (distances, nexthops)) in self.__trees__.iteritems():
+            for node in repair(distances, nexthops, id1, id2, *args):
+                changed.add((self.__labels__[node], root))
+        if self.__allpairs__ is not None:
+            # Memory-mapped matrices are read-only, so repair a private copy.
+            (distances, nexthops) = self.__allpairs__
+            if not distances.flags.writeable:
+                distances = numpy.array(distances)
+            if not nexthops.flags.writeable:
+                nexthops = numpy.array(nexthops)
+            self.__allpairs__ = (distances, nexthops)
+            for root in xrange(len(self.__labels__)):
+                for node in repair(distances[root], nexthops[root], id1, id2, *args):
+                    changed.add((self.__labels__[node], self.__labels__[root]))
+        return changed
+
+    def __decreaseTree__(self, distances, nexthops, id1, id2, weight):
+        'Repairs one shortest path tree after the edge between id1 and id2 was added or got shorter, by running Dijkstra outwards from the endpoints that improved.  Returns the ids whose next hop changed.'
+        heap = []
+        old_nexthops = {}
+        for (node, nexthop) in ((id1, id2), (id2, id1)):
+            if distances[nexthop] >= 0 and (distances[node] < 0 or distances[nexthop] + weight < distances[node]):
+                old_nexthops[node] = nexthops[node]
+                distances[node] = distances[nexthop] + weight
+                nexthops[node] = nexthop
+                heap.append((distances[node], node))
+        heapq.heapify(heap)
+
+        while len(heap) > 0:
+            (distance, node) = heapq.heappop(heap)
+            if distance > distances[node]:
+                continue
+            for (neighbor, edge_weight) in self.nodes[self.__labels__[node]].iteritems():
+                dst = self.__ids__[neighbor]
+                if distances[dst] < 0 or distance + edge_weight < distances[dst]:
+                    if not (dst in old_nexthops):
+                        old_nexthops[dst] = nexthops[dst]
+                    distances[dst] = distance + edge_weight
+                    nexthops[dst] = node
+                    heapq.heappush(heap, (distances[dst], dst))
+
+        return set([node for node in old_nexthops if old_nexthops[node] != nexthops[node]])
+
+    def __increaseTree__(self, distances, nexthops, id1, id2):
+        'Repairs one shortest path tree after the edge between id1 and id2 was removed or got longer.  Only the subtree that routed over the edge is recomputed.  Returns the ids whose next hop changed.'
+        if nexthops[id1] == id2:
+            top = id1
+        elif nexthops[id2] == id1:
+            top = id2
+        else:
+            return set()    # the edge is not on any shortest path
+
+        # Collect every node whose shortest path runs through top.
+        children = {}
+        for node in xrange(len(nexthops)):
+            if nexthops[node] >= 0:
+                children.setdefault(nexthops[node], []).append(node)
+        affected = [top]
+        i = 0
+        while i < len(affected):
+            affected.extend(children.get(affected[i], []))
+            i += 1
+        in_subtree = set(affected)
+        old_nexthops = {}
+        for node in affected:
+            old_nexthops[node] = nexthops[node]
+            distances[node] = -1
+            nexthops[node] = -1
 
-        for node in distances:
-            if not (node in self.__distances__):
-                self.__distances__[node] = {}
-            self.__distances__[node][root] = distances[node]
-            if not (node in self.__nexthops__):
-                self.__nexthops__[node] = {}
-            self.__nexthops__[node][root] = nexthops[node]
+        # Reconnect the subtree through its cheapest edges to the rest of the
+        # tree, whose distances are unaffected.
+        heap = []
+        for node in affected:
+            for (neighbor, edge_weight) in self.nodes[self.__labels__[node]].iteritems():
+                nexthop = self.__ids__[neighbor]
+                if not (nexthop in in_subtree) and distances[nexthop] >= 0:
+                    heap.append((distances[nexthop] + edge_weight, node, nexthop))
+        heapq.heapify(heap)
 
+        while len(heap) > 0:
+            (distance, node, nexthop) = heapq.heappop(heap)
+            if distances[node] >= 0:
+                continue
+            distances[node] = distance
+            nexthops[node] = nexthop
+            for (neighbor, edge_weight) in self.nodes[self.__labels__[node]].iteritems():
+                dst = self.__ids__[neighbor]
+                if dst in in_subtree and distances[dst] < 0:
+                    heapq.heappush(heap, (distance + edge_weight, dst, node))
 
+        return set([node for node in affected if old_nexthops[node] != nexthops[node]])
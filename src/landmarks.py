@@ -0,0 +1,152 @@
+"""
+COS 561 Final Project: Equalized-latency routing
+
+landmarks.py
+Landmark (ALT) distance oracle. Distances from a few landmark nodes give,
+through the triangle inequality, a lower bound on the distance between any
+two nodes, using landmarks x nodes memory instead of a shortest path tree
+per destination.
+"""
+
+
+import heapq
+from array import array
+from collections import OrderedDict
+
+# Number of landmarks an oracle picks unless told otherwise.
+DEFAULT_LANDMARKS = 8
+
+# Number of targets whose lowerBounds() arrays an oracle keeps; each is as
+# long as the graph, so only the most recently used ones are kept.
+BOUNDS_CACHE_SIZE = 16
+
+def csrDistances(csr, source):
+    """
+    Return an array, indexed by CSR node id, of the shortest path distance
+    from every node to node id source, with -1 for unreachable nodes.
+    """
+    n = csr.size()
+    distances = [None] * n
+    heap = [(0, source)]
+    while len(heap) > 0:
+        (distance, node) = heapq.heappop(heap)
+        if distances[node] is not None:
+            continue
+        distances[node] = distance
+        for i in xrange(csr.offsets[node], csr.offsets[node + 1]):
+            if distances[csr.neighbors[i]] is None:
+                heapq.heappush(heap, (distance + csr.weights[i], csr.neighbors[i]))
+    return array(csr.weights.typecode, [-1 if d is None else d for d in distances])
+
+class LandmarkOracle:
+    def __init__(self, g, num_landmarks=DEFAULT_LANDMARKS):
+        """
+        g - graph
+        num_landmarks - number of landmarks; more landmarks give tighter
+            bounds for more memory and set-up time
+
+        Landmarks are picked farthest-first: each new landmark is the node
+        farthest from the landmarks picked so far, which spreads them over
+        the edge of the topology where they bound best.  The oracle is
+        rebuilt whenever the topology of g changes.
+        """
+        self.g = g
+        self.num_landmarks = num_landmarks
+        self.version = None
+        self.landmarks = []
+        # self.distances[k][id] is the distance from landmark k to node id
+        self.distances = []
+        # self.bounds[target] caches lowerBounds(target), least recently
+        # used first
+        self.bounds = OrderedDict()
+
+    def build(self):
+        """
+        Pick the landmarks and compute their distances, if the topology
+        changed since they were last computed.
+        """
+        if self.version == self.g.getVersion():
+            return
+        csr = self.g.getCSR()
+        self.version = self.g.getVersion()
+        self.landmarks = []
+        self.distances = []
+        self.bounds = OrderedDict()
+        if csr.size() == 0:
+            return
+
+        # distance from every node to its nearest landmark; nodes no
+        # landmark reaches are preferred, so every component gets one
+        nearest = None
+        landmark = 0
+        while len(self.landmarks) < min(self.num_landmarks, csr.size()):
+            distances = csrDistances(csr, landmark)
+            self.landmarks.append(landmark)
+            self.distances.append(distances)
+            if nearest is None:
+                nearest = list(distances)
+            else:
+                for node in xrange(len(nearest)):
+                    if distances[node] >= 0 and (nearest[node] < 0 or distances[node] < nearest[node]):
+                        nearest[node] = distances[node]
+            unreached = [node for node in xrange(len(nearest)) if nearest[node] < 0]
+            if len(unreached) > 0:
+                landmark = unreached[0]
+            else:
+                landmark = max(xrange(len(nearest)), key=nearest.__getitem__)
+                if nearest[landmark] == 0:
+                    break   # every node is a landmark already
+
+    def lowerBounds(self, target):
+        """
+        Return an array, indexed by CSR node id, of a lower bound on the
+        shortest path distance from every node to target, with -1 for
+        nodes that certainly cannot reach target.  Only the arrays of the
+        last BOUNDS_CACHE_SIZE targets are kept.
+        """
+        self.build()
+        if target in self.bounds:
+            bounds = self.bounds.pop(target)
+            self.bounds[target] = bounds
+            return bounds
+        t = self.g.getCSR().index[target]
+        bounds = array(self.g.getCSR().weights.typecode, [0]) * len(self.distances[0])
+        for distances in self.distances:
+            to_target = distances[t]
+            for node in xrange(len(bounds)):
+                if bounds[node] < 0:
+                    continue
+                distance = distances[node]
+                if (distance < 0) != (to_target < 0):
+                    bounds[node] = -1   # in another component than target
+                elif distance >= 0 and abs(distance - to_target) > bounds[node]:
+                    bounds[node] = abs(distance - to_target)
+        self.bounds[target] = bounds
+        if len(self.bounds) > BOUNDS_CACHE_SIZE:
+            self.bounds.popitem(last=False)
+        return bounds
+
+    def lowerBound(self, node1, node2):
+        """
+        Return a lower bound on the shortest path distance from node1 to
+        node2, or None if node1 certainly cannot reach node2.
+        """
+        self.build()
+        index = self.g.getCSR().index
+        bound = 0
+        for distances in self.distances:
+            distance1 = distances[index[node1]]
+            distance2 = distances[index[node2]]
+            if (distance1 < 0) != (distance2 < 0):
+                return None
+            if distance1 >= 0:
+                bound = max(bound, abs(distance1 - distance2))
+        return bound
+
+
+if __name__ == '__main__':
+    import graph
+    g = graph.createSampleGraph()
+    oracle = LandmarkOracle(g, 2)
+    for node in g.getNodes():
+        print node, oracle.lowerBound(node, 4), g.getDistance(node, 4)
@@ -0,0 +1,73 @@
+import client_router as cr
+import weakref
+from collections import OrderedDict
+
+# Default memory budget of a router cache, in bytes.
+DEFAULT_BUDGET = 64 * 1024 * 1024
+
+class RouterCache:
+	def __init__(self, budget=DEFAULT_BUDGET):
+		self.budget = budget
+		self.size = 0
+		# entries[(client, servers, max_d, lazy, quantum, version)] is a
+		# (router, size) pair, kept in order from least to most recently used
+		self.entries = OrderedDict()
+		# the topology version each graph had when it was last looked up
+		self.versions = weakref.WeakKeyDictionary()
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+	def get_router(self, graph, servers, client, max_d, lazy=False, quantum=None):
+		version = graph.getVersion()
+		seen = self.versions.get(graph)
+		if seen != version:
+			# the graph changed, so its routers can never be used again
+			if seen is not None:
+				self.invalidate(seen)
+			self.versions[graph] = version
+		key = (client, frozenset(servers), max_d, lazy, quantum, version)
+		entry = self.entries.pop(key, None)
+		if entry is not None:
+			self.hits += 1
+			self.entries[key] = entry
+			return entry[0]
+		self.misses += 1
+		router = cr.ClientRouter(graph, servers, client, max_d, lazy, quantum)
+		size = router.memory_usage()
+		self.entries[key] = (router, size)
+		self.size += size
+		# evict the least recently used routers, but always keep the new one
+		while self.size > self.budget and len(self.entries) > 1:
+			(old_router, old_size) = self.entries.popitem(last=False)[1]
+			self.size -= old_size
+			self.evictions += 1
+		return router
+
+	def invalidate(self, version):
+		for key in [key for key in self.entries if key[5] == version]:
+			self.size -= self.entries.pop(key)[1]
+
+	def clear(self):
+		self.entries.clear()
+		self.versions.clear()
+		self.size = 0
+
+	def get_stats(self):
+		return {'entries': len(self.entries), 'size': self.size, 'budget': self.budget,
+				'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+# the cache shared by all services in the process
+shared_cache = RouterCache()
+
+if __name__ == '__main__':
+	import graph
+	g = graph.createSampleGraph()
+	cache = RouterCache()
+	for servers in [{4, 8}, {8, 4}, {4}]:
+		for client in [1, 2, 5]:
+			cache.get_router(g, servers, client, 10)
+	print cache.get_stats()
+	g.addEdge(1, 8, 3)
+	cache.get_router(g, {4}, 1, 10)
+	print cache.get_stats()
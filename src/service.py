@@ -1,20 +1,46 @@
 import graph
-import client_router as cr
+import router_cache
+import bisect
+import heapq
 import random
 
 
 class Service:
-	def __init__(self, service_id, servers, max_allowable_delay, max_allowable_difference):
+	def __init__(self, service_id, servers, max_allowable_delay, max_allowable_difference, lazy=False, cache=None, approximate=None):
 		random.seed()
 		self.service_id = service_id
 		self.servers = servers
 		self.clients = {}
 		self.offending = {}
 		self.selected_path_length = {}
+		# exact delay of the selected path, which differs from its selected
+		# length when lengths are approximated
+		self.selected_path_delay = {}
 		self.selected_paths_by_client = {}
 		self.changed = set()
 		self.max_allowable_delay = max_allowable_delay
 		self.max_allowable_difference = max_allowable_difference
+		# lazy client routers only compute path lengths up front
+		self.lazy = lazy
+		# in approximate mode, path lengths are rounded to quanta of
+		# approximate * max_allowable_difference (which needs lazy client
+		# routers).  Rounding moves a path of h hops by at most h quanta / 2,
+		# so two selected paths of h1 and h2 hops differ in delay by at most
+		# (h1 + h2) quanta / 2 more than their selected lengths do.  Quanta
+		# are only used to select paths; get_client_path_length() reports
+		# the exact delay of the selected path.
+		self.quantum = None
+		if approximate is not None and max_allowable_difference > 0:
+			self.quantum = approximate * max_allowable_difference
+			self.lazy = True
+		# (shortest, longest) selected path length, while the selection is
+		# within max_allowable_difference; new clients that fit in it are
+		# admitted without touching the other clients
+		self.window = None
+		# client routers are shared with other services through a cache
+		if cache is None:
+			cache = router_cache.shared_cache
+		self.cache = cache
 
 
 	def impossible_settings(self):
@@ -24,10 +50,43 @@ class Service:
 
 	def add_clients(self, graph, clients):
 		self.changed = set()
+		admitted = True
 		for client in clients:
-			self.clients[client] = cr.ClientRouter(graph, self.servers, client, self.max_allowable_delay)
-		temp = self.compute_optimal()
-		self.selected_paths_by_client = temp
+			if client in self.clients:
+				continue
+			self.clients[client] = self.cache.get_router(graph, self.servers, client, self.max_allowable_delay, self.lazy, self.quantum)
+			if admitted:
+				admitted = self.admit(client)
+		if not admitted:
+			temp = self.compute_optimal()
+			self.selected_paths_by_client = temp
+
+	def admit(self, client):
+		# Select a length for a new client that keeps the current window
+		# within max_allowable_difference, widening it as little as
+		# possible.  When all clients share one length, the new client
+		# must have that length too, otherwise a longer common length may
+		# exist.
+		if self.window is None:
+			return False
+		lengths = self.clients[client].get_all_possible_path_lengths()
+		lo, hi = self.window
+		if lo == hi:
+			start = bisect.bisect_left(lengths, lo)
+			end = bisect.bisect_right(lengths, lo)
+		else:
+			start = bisect.bisect_left(lengths, hi - self.max_allowable_difference)
+			end = bisect.bisect_right(lengths, lo + self.max_allowable_difference)
+		if start >= end:
+			return False
+		idx = bisect.bisect_left(lengths, lo, start, end)
+		if idx == end or (idx > start and lo - lengths[idx - 1] < lengths[idx] - hi):
+			idx -= 1
+		length = lengths[idx]
+		self.window = (min(lo, length), max(hi, length))
+		if self.path_length_changed(client, length):
+			self.select_path(client, length)
+		return True
 
 	def remove_client(self, client):
 		self.remove_helper(client)
@@ -53,10 +112,15 @@ class Service:
 		return self.selected_paths_by_client[client]
 
 	def get_client_path_length(self, client):
-		return self.selected_path_length[client]
+		return self.selected_path_delay[client]
 
-	def all_same(self, items):
-		return all(x == items[0] for x in items)
+	def select_path(self, client, length):
+		path = self.clients[client].get_path_of_length(length)
+		self.selected_paths_by_client[client] = path
+		if self.quantum is None:
+			self.selected_path_delay[client] = length
+		else:
+			self.selected_path_delay[client] = self.clients[client].path_delay(path)
 
 	def path_length_changed(self, client, length):
 		if client in self.selected_path_length:
@@ -68,15 +132,13 @@ class Service:
 
 	def compute_optimal(self):
 		path_lengths = []
-		pointers = []
 		bad_clients = []
 		for k in self.clients:
-			path_lengths.append(self.clients[k].get_all_possible_path_lengths())
-			try:
-				pointers.append(path_lengths[-1].pop(0))
-			except IndexError:
-				path_lengths.pop()
+			lengths = self.clients[k].get_all_possible_path_lengths()
+			if len(lengths) == 0:
 				bad_clients.append(k)
+			else:
+				path_lengths.append(lengths)
 
 		for i in bad_clients:
 			self.remove_helper(i)
@@ -85,60 +147,63 @@ class Service:
 		#
 		#
 
-		while not self.all_same(pointers):
-			idx = pointers.index(min(pointers))
-			try:
-				pointers[idx] = path_lengths[idx].pop(0)
-			except IndexError:
-				break;
-		if (not self.all_same(pointers)):
+		pointers, found = self.merge_window(path_lengths, 0)
+		if not found:
 			return self.compute_acceptable()
 		else:
-			selected_paths_by_client = {}
+			self.window = None
+			if len(pointers) > 0:
+				self.window = (pointers[0], pointers[0])
 			for k,v in self.clients.iteritems():
 				if self.path_length_changed(k, pointers[0]):
-					ls = v.get_all_paths_of_length(pointers[0])
-					self.selected_paths_by_client[k] = ls[int(random.random() * len(ls))]
+					self.select_path(k, pointers[0])
 			return self.selected_paths_by_client
 
-	def not_within_difference(self, p):
-		mn = min(p)
-		mx = max(p)
-		return (mx - mn) > self.max_allowable_difference
-                
+	def merge_window(self, path_lengths, width):
+		# k-way merge over the sorted length lists of the clients: keep
+		# advancing the client with the smallest current length until the
+		# current lengths are all within width of each other.  Returns the
+		# current lengths and whether such a window was found before some
+		# client ran out of lengths.
+		iterators = [iter(lengths) for lengths in path_lengths]
+		pointers = [next(it) for it in iterators]
+		if len(pointers) == 0:
+			return pointers, True
+		heap = [(length, idx) for idx, length in enumerate(pointers)]
+		heapq.heapify(heap)
+		maximum = max(pointers)
+		while maximum - heap[0][0] > width:
+			idx = heap[0][1]
+			length = next(iterators[idx], None)
+			if length is None:
+				return pointers, False
+			pointers[idx] = length
+			maximum = max(maximum, length)
+			heapq.heapreplace(heap, (length, idx))
+		return pointers, True
+
 	def compute_acceptable(self):
 		cl = []
 		path_lengths = []
-		lengths = []
-		pointers = []
-		paths = {}
 		for k,v in self.clients.iteritems():
-			cl.append(v)
+			cl.append(k)
 			path_lengths.append(v.get_all_possible_path_lengths())
-			pointers.append(path_lengths[-1].pop(0))
-		while self.not_within_difference(pointers):
-			idx = pointers.index(min(pointers))
-			try:
-				pointers[idx] = path_lengths[idx].pop(0)
-			except IndexError:
-				break;
+		pointers, found = self.merge_window(path_lengths, self.max_allowable_difference)
 
 		maximum = max(pointers)
                         
-		if (self.not_within_difference(pointers)):
+		if not found:
+			self.window = None
 			for k,v in self.clients.iteritems():
-				shortest_path_length = [vl for vl in v.get_all_possible_path_lengths() if vl <= max][-1]
+				shortest_path_length = [vl for vl in v.get_all_possible_path_lengths() if vl <= maximum][-1]
 				if self.path_length_changed(k, shortest_path_length):
-					ls = v.get_all_paths_of_length(shortest_path_length)
-					self.selected_paths_by_client[k] = ls[int(random.random() * len(ls))]
+					self.select_path(k, shortest_path_length)
 			return self.selected_paths_by_client
 		else:
-			selected_paths_by_client = {}
-			for k,v in self.clients.iteritems():
-				idx = cl.index(v)
+			self.window = (min(pointers), max(pointers))
+			for idx, k in enumerate(cl):
 				if self.path_length_changed(k, pointers[idx]):
-					ls = v.get_all_paths_of_length(pointers[idx])
-					self.selected_paths_by_client[k] = ls[int(random.random() * len(ls))]
+					self.select_path(k, pointers[idx])
 			return self.selected_paths_by_client
                                 
 